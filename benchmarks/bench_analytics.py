@@ -0,0 +1,68 @@
+"""Purchases analytics benchmark: columnar (NumPy) group-by against the plain dict list walk.
+
+Usage (from the repository root): python -m benchmarks.bench_analytics [number of receipts]
+"""
+import datetime
+import random
+import sys
+import time
+import tracemalloc
+from kroger_cli.analytics import ReceiptColumns, groupings
+
+
+def generate_receipts(count):
+    start = datetime.datetime(2010, 1, 1)
+    random.seed(42)
+    for i in range(count):
+        transaction_time = start + datetime.timedelta(minutes=i * 53 + random.randint(0, 50))
+        yield {
+            'receiptId': {'divisionNumber': '701', 'storeNumber': str(random.randint(1, 40)),
+                          'terminalNumber': str(random.randint(1, 20)), 'transactionId': str(i)},
+            'transactionTime': transaction_time.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'total': round(random.uniform(1, 300), 2),
+            'totalSavings': round(random.uniform(0, 40), 2),
+        }
+
+
+def legacy_group_by_year(purchases):
+    years = {}
+    for purchase in purchases:
+        year = int(purchase['transactionTime'][:4])
+        if year not in years:
+            years[year] = {'total': 0.0, 'total_savings': 0.0, 'store_visits': 0}
+        years[year]['total'] += purchase['total']
+        years[year]['total_savings'] += purchase['totalSavings']
+        years[year]['store_visits'] += 1
+    return years
+
+
+def measure(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f'{label:<40} {(time.perf_counter() - start) * 1000:>10.1f} ms')
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f'{count} synthetic receipts')
+
+    tracemalloc.start()
+    receipts = list(generate_receipts(count))
+    dicts_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    measure('legacy dict walk (year)', lambda: legacy_group_by_year(receipts))
+    columns = measure('build columns (single pass)', lambda: ReceiptColumns.from_receipts(receipts))
+    data = columns.to_bytes()
+    measure('load columns (store cache)', lambda: ReceiptColumns.from_bytes(data))
+    for by in groupings:
+        groups = measure('group by ' + by, lambda: columns.group_by(by))
+    measure('rolling average (3 groups)', lambda: ReceiptColumns.rolling_average(groups['total']))
+
+    print(f'{"memory: list of dicts":<40} {dicts_memory / 2 ** 20:>10.1f} MB')
+    print(f'{"memory: columns":<40} {columns.nbytes / 2 ** 20:>10.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""End-to-end benchmark of the `KrogerAPI` commands, with headless Chrome against the local stand-in site (no network).
+
+Every run starts a fresh stand-in, browser profile and local data, then times each step in order: browser start,
+sign in, account info, points balance, receipts sync, coupons refresh, clip coupons, survey, the surveys of the
+other recent purchases and the sign in with the persisted session (browser restarted). The median and best times are
+printed per step.
+
+Usage (from the repository root): python -m benchmarks.bench_commands [--runs 3] [--latency 0.05] [--receipts 5000]
+"""
+import argparse
+import asyncio
+import configparser
+import io
+import os
+import statistics
+import tempfile
+import time
+from rich.console import Console
+from benchmarks.standin import StandInServer
+from kroger_cli.cli import KrogerCLI
+
+profile = {
+    'first_name': 'Jane', 'last_name': 'Doe', 'email_address': 'someone@example.com',
+    'loyalty_card_number': '4800000000001', 'mobile_phone': '5550100000', 'address_line1': '1 Main St',
+    'city': 'Cincinnati', 'state': 'OH', 'zip': '45202', 'age': '40',
+}
+
+
+def create_cli(directory, server, headless=True, block_requests=True):
+    config = configparser.ConfigParser()
+    config['main'] = {'username': 'someone@example.com', 'password': 'secret', 'domain': 'kroger.com'}
+    config['profile'] = profile
+    config_file = os.path.join(directory, 'config.ini')
+    with open(config_file, 'w') as f:
+        config.write(f)
+
+    cli = KrogerCLI(config_file, Console(file=io.StringIO()))
+    cli.api.base_url = server.url
+    cli.api.survey_url = server.survey_url
+    cli.api.headless = headless
+    cli.api.use_daemon = False
+    cli.api.block_requests = block_requests
+    cli.api.user_data_dir = os.path.join(directory, 'user-data')
+    return cli
+
+
+def get_steps(api):
+    async def restart():
+        await api.destroy()
+        return await api.ensure_signed_in()
+
+    return [
+        ('browser start', api.init),
+        ('sign in', api.ensure_signed_in),
+        ('account info', api._get_account_info),
+        ('points balance', api._get_points_balance),
+        ('receipts sync', api._sync_receipts),
+        ('coupons refresh', api._refresh_coupons_catalog),
+        ('clip coupons', api._clip_coupons),
+        ('survey', api._complete_survey),
+        ('surveys (all eligible)', api._complete_all_surveys),
+        ('sign in (persisted session)', restart),
+    ]
+
+
+def run_once(loop, args):
+    server = StandInServer(latency=args.latency, receipts=args.receipts, coupons=args.coupons,
+                           survey_pages=args.survey_pages, purchases=args.purchases).start()
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        # Local data and memoized results go to the working directory, keep every run cold
+        os.chdir(directory)
+        try:
+            cli = create_cli(directory, server, not args.headful, not args.disable_blocking)
+            for label, step in get_steps(cli.api):
+                start = time.perf_counter()
+                result = loop.run_until_complete(step())
+                timings[label] = (time.perf_counter() - start, result is not None and result is not False)
+            loop.run_until_complete(cli.api.destroy())
+        finally:
+            os.chdir(cwd)
+            server.stop()
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the commands against the local stand-in site.')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every stand-in response.')
+    parser.add_argument('--receipts', type=int, default=1000)
+    parser.add_argument('--coupons', type=int, default=500)
+    parser.add_argument('--survey-pages', type=int, default=5)
+    parser.add_argument('--purchases', type=int, default=3, help='Number of recent purchases (surveys to complete).')
+    parser.add_argument('--headful', action='store_true', help='Show the browser.')
+    parser.add_argument('--disable-blocking', action='store_true', help='Load every resource (no request policy).')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runs = [run_once(loop, args) for _ in range(args.runs)]
+
+    print(f'{args.runs} run(s), latency {args.latency * 1000:.0f} ms, {args.receipts} receipts, '
+          f'{args.coupons} coupons, {args.survey_pages} survey pages')
+    print(f'{"step":<30} {"median":>10} {"best":>10}  ok')
+    for label in runs[0]:
+        elapsed = [run[label][0] for run in runs]
+        ok = sum(run[label][1] for run in runs)
+        print(f'{label:<30} {statistics.median(elapsed) * 1000:>7.0f} ms {min(elapsed) * 1000:>7.0f} ms  '
+              f'{ok}/{args.runs}')
+
+
+if __name__ == '__main__':
+    main()
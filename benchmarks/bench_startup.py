@@ -0,0 +1,119 @@
+"""Startup benchmark: time of `python -m kroger_cli --help` and of a command answered from the memoize cache.
+
+Fails (exit status 1) when `--help` takes longer than the budget, or when the cached command imports the browser
+driver. Every command runs in a fresh temporary directory, the slowest imports of `--help` are listed.
+
+Usage (from the repository root): python -m benchmarks.bench_startup [--runs 10] [--budget 100]
+"""
+import argparse
+import configparser
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+cached_command = """
+import runpy, sys
+sys.argv = ['kroger-cli', 'points-balance']
+try:
+    runpy.run_module('kroger_cli', run_name='__main__')
+except SystemExit:
+    pass
+sys.stderr.write('zendriver imported: ' + str('zendriver' in sys.modules) + '\\n')
+"""
+
+points_balance = [
+    {'programBalance': {'balance': '0'}},
+    {'programDisplayInfo': {'loyaltyProgramName': 'Fuel Points'}, 'programBalance': {'balanceDescription': '1,234'}},
+]
+
+
+def run(args, directory, **kwargs):
+    env = dict(os.environ, PYTHONPATH=root)
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable] + args, cwd=directory, env=env, capture_output=True, text=True,
+                             **kwargs)
+    return time.perf_counter() - start, process
+
+
+def fill_cache(directory):
+    """Account config and a cached points balance, as left by a previous `points-balance` run."""
+    config = configparser.ConfigParser()
+    config['main'] = {'username': 'someone@example.com', 'password': 'secret', 'domain': 'kroger.com'}
+    config['profile'] = {'first_name': 'Jane'}
+    with open(os.path.join(directory, 'config.ini'), 'w') as f:
+        config.write(f)
+
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        from rich.console import Console
+        from kroger_cli.cli import KrogerCLI
+        from kroger_cli.api import KrogerAPI
+        from kroger_cli.memoize import memoized
+
+        api = KrogerCLI('config.ini', Console(file=io.StringIO())).api
+        function = KrogerAPI.__dict__['get_points_balance']
+        memoized.get_store().set(function.get_key((api,), {}), points_balance, function.ttl)
+    finally:
+        os.chdir(cwd)
+
+
+def get_slowest_imports(directory, limit=8):
+    _, process = run(['-X', 'importtime', '-m', 'kroger_cli', '--help'], directory)
+    imports = []
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit() and not name.startswith('  '):
+                imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the startup time of the CLI.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=100, help='Maximum median `--help` time (ms).')
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        run(['-m', 'kroger_cli', '--help'], directory)
+        baseline = statistics.median(run(['-c', 'pass'], directory)[0] for _ in range(args.runs)) * 1000
+        help_time = statistics.median(run(['-m', 'kroger_cli', '--help'], directory)[0]
+                                      for _ in range(args.runs)) * 1000
+        created = os.listdir(directory)
+
+        print(f'{"python startup (baseline)":<40} {baseline:>8.1f} ms')
+        print(f'{"kroger_cli --help":<40} {help_time:>8.1f} ms  (budget {args.budget:.0f} ms)')
+        for cumulative, name in get_slowest_imports(directory):
+            print(f'    import {name:<32} {cumulative / 1000:>8.1f} ms')
+        if help_time > args.budget:
+            print('FAILED: --help is over budget')
+            ok = False
+        if created:
+            print('FAILED: --help created ' + ', '.join(created))
+            ok = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        fill_cache(directory)
+        elapsed, process = run(['-c', cached_command], directory, timeout=60)
+        imported = 'zendriver imported: True' in process.stderr
+        print(f'{"kroger_cli points-balance (cached)":<40} {elapsed * 1000:>8.1f} ms')
+        if '1,234' not in process.stdout:
+            print('FAILED: the cached points balance wasn\'t displayed')
+            ok = False
+        if imported:
+            print('FAILED: the cached command imported the browser driver')
+            ok = False
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Sale alerts benchmark: time of a watchlist check (snapshot diff and term matching) over synthetic offers.
+
+Fails (exit status 1) when offers that didn't change, or that were only clipped, are alerted again.
+
+Usage (from the repository root): python -m benchmarks.bench_watch [number of offers] [number of terms]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from kroger_cli.watch import Watchlist
+
+brands = ['Kroger', 'Simple Truth', 'Private Selection', 'Oreo', 'Chobani', 'Tide', 'Coca-Cola', 'Cheerios']
+products = ['greek yogurt', 'sandwich cookies', 'laundry detergent', 'cereal', 'soda', 'coffee', 'ice cream',
+            'frozen pizza', 'paper towels', 'orange juice']
+categories = ['Dairy', 'Snacks', 'Cleaning', 'Breakfast', 'Beverages', 'Frozen', 'Household']
+
+
+def generate_offers(count):
+    random.seed(42)
+    return [{
+        'id': str(i),
+        'brand': random.choice(brands),
+        'description': 'Save $' + str(random.randint(1, 5)) + ' on ' + random.choice(products) + ' ' + str(i),
+        'value': random.randint(25, 500) / 100,
+        'expiration_date': '2030-01-' + str(random.randint(10, 28)),
+        'category': random.choice(categories),
+        'clipped': False,
+    } for i in range(count)]
+
+
+def generate_terms(count):
+    words = sorted(set(' '.join(brands + products).lower().split()))
+    return [' '.join(random.sample(words, random.randint(1, 2))) + ' ' + str(i) for i in range(count)]
+
+
+def measure(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f'{label:<40} {(time.perf_counter() - start) * 1000:>10.1f} ms')
+    return result
+
+
+def main():
+    offers_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    terms_count = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    print(f'{offers_count} synthetic offers, {terms_count} watch terms')
+
+    offers = generate_offers(offers_count)
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        watchlist = Watchlist('bench', os.path.join(directory, 'watch.sqlite'))
+        try:
+            watchlist.add_terms(generate_terms(terms_count) + products)
+            alerts = measure('first run (all offers, new terms)', lambda: watchlist.check(offers))
+            print(f'{"alerts":<40} {len(alerts):>10}')
+
+            repeated = measure('unchanged offers', lambda: watchlist.check(offers))
+            if repeated:
+                print(f'FAILED: {len(repeated)} unchanged offers were alerted again')
+                ok = False
+
+            for offer in offers[::2]:
+                offer['clipped'] = True
+            repeated = measure('clipped offers', lambda: watchlist.check(offers))
+            if repeated:
+                print(f'FAILED: {len(repeated)} clipped offers were alerted again')
+                ok = False
+
+            for offer in offers[::10]:
+                offer['value'] += 1
+            changed = measure('changed offers (1 in 10)', lambda: watchlist.check(offers))
+            print(f'{"alerts":<40} {len(changed):>10}')
+            if not changed:
+                print('FAILED: the changed offers weren\'t alerted')
+                ok = False
+        finally:
+            watchlist.close()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
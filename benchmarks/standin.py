@@ -0,0 +1,278 @@
+"""Local stand-in for the Kroger site and the feedback survey, serving the pages and JSON endpoints `KrogerAPI` uses.
+
+Latency and payload sizes are configurable, so the commands can be benchmarked (see `bench_commands`) without network.
+Point the API at it with `KrogerAPI.base_url = server.url` and `KrogerAPI.survey_url = server.survey_url`.
+
+Usage (from the repository root): python -m benchmarks.standin [--port 8123] [--latency 0.05] [--receipts 1000]
+"""
+import argparse
+import datetime
+import html
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+session_cookie = 'standin-session'
+
+page_template = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>{body}</body></html>"""
+
+signin_body = """
+<form method="post" action="/signin?redirectUrl={redirect}">
+    <label for="signInName">Email Address</label>
+    <input id="signInName" name="signInName" type="email">
+    <label for="password">Password</label>
+    <input id="password" name="password" type="password">
+    <button type="submit">Sign In</button>
+</form>"""
+
+profile_body = """
+<h1>Profile Information</h1>
+<dl>
+    <dt>Current Email:</dt><dd data-qa="Current Email: -value">{email}</dd>
+    <dt>Current Value Card Number:</dt><dd data-qa="Current Value Card Number: -value">4800000000001</dd>
+    <dt>Current Alt ID:</dt><dd data-qa="Current Alt ID: -value">5550100000</dd>
+</dl>"""
+
+purchase_card_body = """
+<div class="PurchaseCard">
+    <div class="PurchaseCard-top-view-details-button"><a href="{href}">{label}</a></div>
+</div>"""
+
+receipt_body = """
+<pre>Entry ID: 12345-67890-12345-67890-12345-{number:02d} Date: {date} Time: 10:30am Store: 701</pre>"""
+
+coupons_page_body = """
+<div class="Coupons">{buttons}</div>"""
+
+survey_body = """
+<form method="get" action="{action}">
+    {fields}
+    <input id="NextButton" type="submit" value="Next">
+</form>"""
+
+
+class StandInServer:
+    """Threaded HTTP server holding the state of one fake account (session, clipped coupons, survey progress)."""
+
+    def __init__(self, port=0, latency=0.0, receipts=1000, coupons=500, survey_pages=5, purchases=3, seed=42):
+        self.latency = latency
+        self.purchases = purchases
+        self.survey_pages = survey_pages
+        self.clipped = set()
+        self.hits = {}
+        self.lock = threading.Lock()
+        self.receipts_json = json.dumps(generate_receipts(receipts, seed))
+        self.coupons = generate_coupons(coupons, seed)
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:' + str(self.httpd.server_address[1])
+
+    @property
+    def survey_url(self):
+        return self.url + '/krogerstoresfeedback/Index.aspx'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, path):
+        with self.lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(StandInHandler):
+            standin = server
+
+        return Handler
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    standin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        self.standin.count(url.path)
+        if self.standin.latency:
+            time.sleep(self.standin.latency)
+
+        signed_in = session_cookie + '=1' in (self.headers.get('Cookie') or '')
+        path = url.path.rstrip('/') or '/'
+
+        if path == '/robots.txt':
+            return self._send(200, 'User-agent: *\nDisallow:\n', 'text/plain')
+        if path == '/signin':
+            if method == 'POST':
+                return self._sign_in(query)
+            return self._send_page('Sign In', signin_body.format(
+                redirect=html.escape(urllib.parse.quote(query.get('redirectUrl', '/account/update')))))
+        if path.startswith('/krogerstoresfeedback'):
+            return self._survey(path, query)
+
+        if '/api/' in path:
+            if not signed_in:
+                return self._send_json(401, {'error': 'unauthorized'})
+            return self._api(method, path)
+
+        if not signed_in:
+            return self._redirect('/signin?redirectUrl=' + urllib.parse.quote(self.path))
+        if path == '/account/update':
+            return self._send_page('Profile', profile_body.format(email='someone@example.com'))
+        if path == '/mypurchases':
+            # One purchase a day, the most recent first
+            cards = ''.join(purchase_card_body.format(href='/mypurchases/detail/' + str(number),
+                                                      label='See Order Details')
+                            for number in range(self.standin.purchases))
+            return self._send_page('My Purchases', cards)
+        if path.startswith('/mypurchases/detail/'):
+            number = path.rsplit('/', 1)[1]
+            return self._send_page('Order Details', purchase_card_body.format(href='/mypurchases/image/' + number,
+                                                                             label='View Receipt'))
+        if path.startswith('/mypurchases/image/'):
+            number = int(path.rsplit('/', 1)[1])
+            date = datetime.date.today() - datetime.timedelta(days=number)
+            return self._send_page('Receipt', receipt_body.format(number=number, date=date.strftime('%m/%d/%y')))
+        if path == '/cl/coupons':
+            buttons = ''.join('<button class="kds-Button--favorable">Clip</button>' for _ in range(50))
+            return self._send_page('Coupons', coupons_page_body.format(buttons=buttons))
+        return self._send(404, 'Not Found', 'text/plain')
+
+    def _sign_in(self, query):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+        if not form.get('signInName') or not form.get('password'):
+            return self._send_page('Sign In', signin_body.format(redirect='/account/update'), 401)
+
+        self.send_response(303)
+        self.send_header('Location', query.get('redirectUrl') or '/account/update')
+        self.send_header('Set-Cookie', session_cookie + '=1; Path=/; HttpOnly')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _api(self, method, path):
+        standin = self.standin
+        if path == '/accountmanagement/api/points-summary':
+            return self._send_json(200, [{'programBalance': {'balance': '1234'}, 'programName': 'Fuel Points'}])
+        if path == '/mypurchases/api/v1/receipt/summary/by-user-id':
+            return self._send(200, standin.receipts_json, 'application/json')
+        if path == '/cl/api/coupons':
+            coupons = dict((coupon['id'], dict(coupon, addedToCard=coupon['id'] in standin.clipped))
+                           for coupon in standin.coupons)
+            return self._send_json(200, {'data': {'coupons': coupons}})
+        if path == '/cl/api/coupons/clip-unclip' and method == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            with standin.lock:
+                standin.clipped.update(request['couponId'] for request in body.get('clipRequests', []))
+            return self._send_json(200, {'data': {'clipped': len(body.get('clipRequests', []))}})
+        return self._send_json(404, {'error': 'not found'})
+
+    def _survey(self, path, query):
+        page = int(query.get('page', 0))
+        if path.endswith('/Finish.aspx'):
+            return self._send_page('Finish', '<p>Thank you for completing the survey.</p>')
+        if path.endswith('/Index.aspx'):
+            fields = '<input id="Index_VisitDateDatePicker" name="date" value="{}">'.format(
+                html.escape(query.get('Index_VisitDateDatePicker', '')))
+            return self._send_page('Survey', survey_body.format(action='Survey.aspx', fields=fields))
+        if page >= self.standin.survey_pages:
+            return self._redirect('/krogerstoresfeedback/Finish.aspx')
+
+        fields = ''.join(f'<input class="simpleInput" type="radio" name="q{page}" value="{value}">'
+                         for value in range(1, 11))
+        fields += f'<input type="hidden" name="page" value="{page + 1}">'
+        return self._send_page('Survey', survey_body.format(action='Survey.aspx', fields=fields))
+
+    def _redirect(self, location):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_page(self, title, body, status=200):
+        self._send(status, page_template.format(title=title, body=body), 'text/html; charset=utf-8')
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data), 'application/json')
+
+    def _send(self, status, text, content_type):
+        data = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def generate_receipts(count, seed=42):
+    random.seed(seed)
+    start = datetime.datetime(2015, 1, 1)
+    return [{
+        'receiptId': {'divisionNumber': '701', 'storeNumber': str(random.randint(1, 40)),
+                      'terminalNumber': str(random.randint(1, 20)), 'transactionId': str(i)},
+        'transactionTime': (start + datetime.timedelta(hours=i * 37)).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'total': round(random.uniform(1, 300), 2),
+        'totalSavings': round(random.uniform(0, 40), 2),
+    } for i in range(count)]
+
+
+def generate_coupons(count, seed=42):
+    random.seed(seed)
+    brands = ['Kroger', 'Simple Truth', 'Private Selection', 'Chobani', 'Oreo', 'Tide', 'Coca-Cola', 'Dannon']
+    products = ['Greek Yogurt', 'Cereal', 'Laundry Detergent', 'Soda 12 Pack', 'Ice Cream', 'Cookies', 'Coffee']
+    return [{
+        'id': str(100000 + i),
+        'brandName': random.choice(brands),
+        'shortDescription': 'Save $' + str(random.randint(1, 5)) + '.00 on ' + random.choice(products),
+        'value': random.randint(1, 5),
+        'expirationDate': '2099-12-31T00:00:00Z',
+        'categories': ['Grocery'],
+        'addedToCard': False,
+    } for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Kroger site.')
+    parser.add_argument('--port', type=int, default=8123)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response.')
+    parser.add_argument('--receipts', type=int, default=1000, help='Number of receipts served.')
+    parser.add_argument('--coupons', type=int, default=500, help='Number of coupons served.')
+    parser.add_argument('--survey-pages', type=int, default=5, help='Number of survey pages before the finish page.')
+    parser.add_argument('--purchases', type=int, default=3, help='Number of recent purchases (one a day).')
+    args = parser.parse_args()
+
+    server = StandInServer(args.port, args.latency, args.receipts, args.coupons, args.survey_pages, args.purchases)
+    print('Serving on ' + server.url + ' (survey: ' + server.survey_url + '), Ctrl+C to stop')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
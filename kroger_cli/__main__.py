@@ -1,51 +1,207 @@
 import click
-from kroger_cli.cli import KrogerCLI
 
-kroger_cli = KrogerCLI()
+# Created on first use: `--help` (and argument errors) don't read the config, prompt or import the API
+_kroger_cli = None
+# KrogerAPI attributes set by the group's options, applied once the CLI is created
+api_settings = {}
+
+
+def get_kroger_cli():
+    global _kroger_cli
+    if _kroger_cli is None:
+        from kroger_cli.cli import KrogerCLI
+        _kroger_cli = KrogerCLI()
+        for name, value in api_settings.items():
+            setattr(_kroger_cli.api, name, value)
+    return _kroger_cli
 
 
 @click.group(invoke_without_command=True)
 @click.pass_context
 @click.option('--disable-headless', is_flag=True, help='Disable chromium\'s headless mode (useful for debug).')
-def cli(ctx, disable_headless):
+@click.option('--page-timeout', type=float, default=None,
+              help='Maximum number of seconds to wait for a page to become ready (default: 20).')
+@click.option('--disable-blocking', is_flag=True,
+              help='Load every resource (images, fonts, trackers..), useful when a page doesn\'t render as expected.')
+@click.option('--profile', type=click.Path(dir_okay=False), default=None,
+              help='Trace the run (in this process, not on the daemon) and write it to this file (Chrome trace '
+                   'format), then display the slowest phases.')
+def cli(ctx, disable_headless, page_timeout, disable_blocking, profile):
     if disable_headless:
-        kroger_cli.api.browser_options['headless'] = False
+        api_settings['headless'] = False
+    if page_timeout is not None:
+        api_settings['page_timeout'] = page_timeout
+    if disable_blocking:
+        api_settings['block_requests'] = False
+    if profile is not None:
+        from kroger_cli import tracing
+        tracing.enable()
+        api_settings['use_daemon'] = False
+        ctx.call_on_close(lambda: get_kroger_cli().write_profile(profile))
 
     # CLI call without a command
     if ctx.invoked_subcommand is None:
-        kroger_cli.prompt_options()
+        get_kroger_cli().prompt_options()
 
 
 @click.command('account-info', help='Display account info.')
 def account_info():
-    kroger_cli.option_account_info()
+    get_kroger_cli().option_account_info()
 
 
 @click.command('clip-coupons', help='Clip all digital coupons.')
-def clip_coupons():
-    kroger_cli.option_clip_coupons()
+@click.option('--concurrency', type=int, default=None, help='Number of clip requests sent at once (default: 4).')
+def clip_coupons(concurrency):
+    if concurrency is not None:
+        api_settings['clip_concurrency'] = concurrency
+    get_kroger_cli().option_clip_coupons()
+
+
+@click.group('coupons', help='Search the local index of digital coupons.')
+def coupons():
+    pass
+
+
+@coupons.command('refresh', help='Update the local coupons index (only new and changed coupons are written).')
+def coupons_refresh():
+    get_kroger_cli().option_coupons_refresh()
+
+
+@coupons.command('search', help='Search the local coupons index (brand, description, category).')
+@click.argument('query', nargs=-1)
+@click.option('--limit', type=int, default=20, show_default=True, help='Maximum number of coupons displayed.')
+@click.option('--include-expired', is_flag=True, help='Include coupons that are no longer available.')
+@click.option('--refresh', is_flag=True, help='Update the index before searching.')
+def coupons_search(query, limit, include_expired, refresh):
+    if refresh:
+        get_kroger_cli().option_coupons_refresh()
+    get_kroger_cli().option_coupons_search(' '.join(query), limit, include_expired)
+
+
+@click.group('watch', help='Get alerted when watched products or brands get a new offer.')
+def watch():
+    pass
+
+
+@watch.command('add', help='Watch a product or brand (every word must match, e.g. "greek yogurt").')
+@click.argument('terms', nargs=-1, required=True)
+def watch_add(terms):
+    get_kroger_cli().option_watch_add(terms)
+
+
+@watch.command('remove', help='Stop watching a product or brand.')
+@click.argument('terms', nargs=-1, required=True)
+def watch_remove(terms):
+    get_kroger_cli().option_watch_remove(terms)
+
+
+@watch.command('list', help='Display the watchlist.')
+def watch_list():
+    get_kroger_cli().option_watch_list()
+
+
+@watch.command('run', help='Load the offers and alert on the new or changed ones matching the watchlist.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Also append the alerts to this file (JSON Lines).')
+@click.option('--webhook', default=None, help='Also POST the alerts (JSON) to this URL, e.g. http://localhost:8080/.')
+def watch_run(output, webhook):
+    get_kroger_cli().option_watch_run(output, webhook)
 
 
 @click.command('purchases-summary', help='Purchases Summary.')
-def purchases_summary():
-    kroger_cli.option_purchases_summary()
+@click.option('--refresh', is_flag=True, help='Sync the new receipts from the site, even if synced recently.')
+@click.option('--by', type=click.Choice(['year', 'month', 'week', 'weekday', 'store']), default='year',
+              show_default=True, help='Group the purchases by.')
+def purchases_summary(refresh, by):
+    get_kroger_cli().option_purchases_summary(refresh, by)
+
+
+@click.group('export', help='Export data from the local store.')
+def export():
+    pass
+
+
+@export.command('purchases', help='Export the purchases (receipts) to a CSV, XLSX or JSON Lines file.')
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'xlsx', 'jsonl']), default=None,
+              help='File format (default: from the file extension, otherwise csv).')
+@click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), default=None, help='First day (YYYY-MM-DD).')
+@click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), default=None, help='Last day (YYYY-MM-DD).')
+@click.option('--since-last-export', is_flag=True, help='Append the receipts added since the last export to this file (csv and jsonl).')
+@click.option('--sync', is_flag=True, help='Sync the new receipts from the site first.')
+def export_purchases(output, file_format, date_from, date_to, since_last_export, sync):
+    if file_format is None:
+        extension = output.rsplit('.', 1)[-1].lower()
+        file_format = extension if extension in ('csv', 'xlsx', 'jsonl') else 'csv'
+    get_kroger_cli().option_export_purchases(output, file_format, date_from, date_to, since_last_export, sync)
 
 
 @click.command('points-balance', help='Retrieve Points Balance.')
 def points_balance():
-    kroger_cli.option_points_balance()
+    get_kroger_cli().option_points_balance()
+
+
+@click.command('dashboard', help='Display account info, points balance and purchases summary (loaded in parallel).')
+def dashboard():
+    get_kroger_cli().option_dashboard()
 
 
 @click.command('survey', help='Complete Kroger’s Survey (to earn 50 points).')
-def survey():
-    kroger_cli.option_survey()
+@click.option('--all-eligible', is_flag=True,
+              help='Complete the survey of every recent purchase (last 7 days) not completed yet, several at once.')
+def survey(all_eligible):
+    get_kroger_cli().option_survey(all_eligible)
+
+
+@click.command('batch', help='Run a command for every account listed in an accounts file.')
+@click.argument('command', type=click.Choice(['clip-coupons', 'points-balance', 'survey']))
+@click.option('--accounts', 'accounts_file', default='accounts.ini', show_default=True, type=click.Path(exists=True),
+              help='Ini file with one section (username, password, domain) per account.')
+@click.option('--workers', type=int, default=None, help='Number of concurrent browsers (default: up to 4).')
+def batch_run(command, accounts_file, workers):
+    from kroger_cli import batch
+    # Every account has its own config, the default one isn't needed (nor prompted for)
+    batch.BatchRunner(accounts_file, workers).run(command)
+
+
+@click.command('schedule', help='Run clip-coupons, survey and points-balance on a schedule, on one signed-in browser.')
+@click.option('--jobs', 'jobs_file', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='Ini file with one section per job (`every` or `cron`, `jitter`, `timeout`), default: coupons '
+                   'every 6h, survey at 9:00, points balance at 8:00.')
+@click.option('--once', is_flag=True,
+              help='Run every job once (skipping the ones whose inputs didn\'t change), then exit.')
+def schedule_run(jobs_file, once):
+    get_kroger_cli().option_schedule(jobs_file, once)
+
+
+@click.command('daemon', help='Keep a signed-in browser running in the background, other commands will use it.')
+@click.option('--stop', is_flag=True, help='Stop the running daemon.')
+def daemon_run(stop):
+    from kroger_cli import daemon
+    if not daemon.is_supported():
+        click.echo('The daemon requires Unix domain sockets (not available on this platform).', err=True)
+    elif stop:
+        if daemon.is_running():
+            daemon.stop()
+        click.echo('Daemon stopped.')
+    else:
+        kroger_cli = get_kroger_cli()
+        kroger_cli.api.use_daemon = False
+        daemon.KrogerDaemon(kroger_cli).serve()
 
 
 if __name__ == '__main__':
     cli.add_command(account_info)
     cli.add_command(clip_coupons)
+    cli.add_command(coupons)
+    cli.add_command(watch)
     cli.add_command(purchases_summary)
     cli.add_command(points_balance)
     cli.add_command(survey)
+    cli.add_command(dashboard)
+    cli.add_command(export)
+    cli.add_command(batch_run)
+    cli.add_command(daemon_run)
+    cli.add_command(schedule_run)
 
     cli()
@@ -0,0 +1,156 @@
+import array
+import datetime
+import io
+import numpy as np
+from kroger_cli.purchases import get_store_id
+
+groupings = ['year', 'month', 'week', 'weekday', 'store']
+# Groupings on consecutive periods, and the length of a period in units of their keys
+periods = {'year': 1, 'month': 1, 'week': 7}
+weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class ReceiptColumns:
+    """Receipts held column-wise: NumPy arrays for timestamps, totals and savings, interned store IDs.
+    Built in a single pass over any iterable of receipts (the dicts aren't kept around).
+    """
+
+    def __init__(self, times, totals, savings, has_total, stores, store_ids):
+        self.times = times
+        self.totals = totals
+        self.savings = savings
+        self.has_total = has_total
+        self.stores = stores
+        self.store_ids = store_ids
+
+    @classmethod
+    def from_receipts(cls, receipts):
+        times = []
+        totals = array.array('d')
+        savings = array.array('d')
+        has_total = array.array('b')
+        stores = array.array('i')
+        store_codes = {}
+        # Bound methods, this loop runs once per receipt
+        add_time, add_total, add_saving, add_has_total, add_store = (times.append, totals.append, savings.append,
+                                                                     has_total.append, stores.append)
+
+        for receipt in receipts:
+            add_time(receipt['transactionTime'][:19])
+            total = receipt.get('total')
+            if total is None:
+                add_total(0.0)
+                add_has_total(0)
+            else:
+                add_total(total)
+                add_has_total(1)
+            add_saving(receipt.get('totalSavings') or 0.0)
+            store_id = get_store_id(receipt)
+            code = store_codes.get(store_id)
+            if code is None:
+                code = store_codes[store_id] = len(store_codes)
+            add_store(code)
+
+        return cls(np.array(times, dtype='datetime64[s]'),
+                   np.frombuffer(totals, dtype=np.float64),
+                   np.frombuffer(savings, dtype=np.float64),
+                   np.frombuffer(has_total, dtype=np.int8).astype(bool),
+                   np.frombuffer(stores, dtype=np.int32),
+                   list(store_codes))
+
+    @classmethod
+    def from_store(cls, store):
+        """Columns of the receipts of a `ReceiptStore`, cached in the store until receipts are added (building them
+        means decoding every receipt's JSON).
+        """
+        version = store.get_version()
+        data = store.get_cached_columns(version)
+        if data is not None:
+            try:
+                return cls.from_bytes(data)
+            except (ValueError, KeyError, OSError):
+                # Written by another version, rebuilt below
+                pass
+
+        columns = cls.from_receipts(store.iter_receipts())
+        store.set_cached_columns(version, columns.to_bytes())
+        return columns
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, times=self.times.astype(np.int64), totals=self.totals, savings=self.savings,
+                 has_total=self.has_total, stores=self.stores, store_ids=np.array(self.store_ids, dtype=str))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            return cls(arrays['times'].astype('datetime64[s]'), arrays['totals'], arrays['savings'],
+                       arrays['has_total'], arrays['stores'], arrays['store_ids'].tolist())
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.totals.nbytes + self.savings.nbytes + self.has_total.nbytes + self.stores.nbytes
+
+    def get_keys(self, by):
+        days = self.times.astype('datetime64[D]')
+        if by == 'year':
+            return self.times.astype('datetime64[Y]')
+        elif by == 'month':
+            return self.times.astype('datetime64[M]')
+        elif by == 'week':
+            # Monday of the (ISO) week, 1970-01-01 was a Thursday
+            return days - (days.astype(np.int64) + 3) % 7
+        elif by == 'weekday':
+            return (days.astype(np.int64) + 3) % 7
+        elif by == 'store':
+            return self.stores
+        raise ValueError('Unknown grouping: ' + by)
+
+    def get_label(self, by, key):
+        if by == 'year':
+            return str(key)[:4]
+        elif by == 'month':
+            return str(key)[:7]
+        elif by == 'week':
+            year, week, _ = key.astype(datetime.date).isocalendar()
+            return f'{year}-W{week:02d}'
+        elif by == 'weekday':
+            return weekdays[int(key)]
+        return self.store_ids[int(key)]
+
+    def group_by(self, by='year'):
+        """Vectorized group-by. Returns the (sorted) keys, labels and the per-group store visits, totals and savings."""
+        keys, inverse = np.unique(self.get_keys(by), return_inverse=True)
+        size = len(keys)
+        return {
+            'keys': keys,
+            'labels': [self.get_label(by, key) for key in keys],
+            'store_visits': np.bincount(inverse, weights=self.has_total, minlength=size).astype(np.int64),
+            'total': np.bincount(inverse, weights=self.totals, minlength=size),
+            'total_savings': np.bincount(inverse, weights=self.savings, minlength=size),
+        }
+
+    @staticmethod
+    def get_positions(by, keys):
+        """Index of every key (sorted, see `group_by`) in the contiguous range of periods from the first one."""
+        if not len(keys):
+            return np.zeros(0, dtype=np.int64)
+        return (keys - keys[0]).astype(np.int64) // periods[by]
+
+    @staticmethod
+    def rolling_average(values, window=3, positions=None):
+        """Trailing average over `window` groups (shorter at the start). With `positions` (see `get_positions`), the
+        window covers `window` consecutive periods, the ones without purchases counting as 0.
+        """
+        if positions is not None:
+            filled = np.zeros(int(positions[-1]) + 1 if len(positions) else 0)
+            filled[positions] = values
+            return ReceiptColumns.rolling_average(filled, window)[positions]
+        cumulative = np.cumsum(np.insert(np.asarray(values, dtype=np.float64), 0, 0.0))
+        ends = np.arange(1, len(values) + 1)
+        starts = np.maximum(ends - window, 0)
+        return (cumulative[ends] - cumulative[starts]) / (ends - starts)
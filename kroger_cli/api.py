@@ -1,110 +1,257 @@
 import asyncio
 import json
-import re
 import datetime
+import time
+import urllib.parse
 import kroger_cli.cli
 from kroger_cli.memoize import memoized
+from kroger_cli import blocking
+from kroger_cli import daemon
+from kroger_cli import extract
 from kroger_cli import helper
-import zendriver as zd
+from kroger_cli import popups
+from kroger_cli.catalog import CouponCatalog
+from kroger_cli.ledger import Ledger
+from kroger_cli.purchases import ReceiptStore
+from kroger_cli.tabs import TabPool
+from kroger_cli.watch import Watchlist
+from kroger_cli import readiness
+from kroger_cli import retry
+from kroger_cli import tracing
+from kroger_cli import transport
 
 
 class KrogerAPI:
     # zendriver configuration
     headless = False
     user_data_dir = '.user-data'
+    # Prefix for the memoized entries (keeps several accounts apart)
+    cache_namespace = ''
+    # Ceiling (in seconds) for any single page readiness wait
+    page_timeout = 20
+    # Ceiling (in seconds) for the authentication probe of a persisted session
+    probe_timeout = 5
+    # Send the commands to the background daemon (warm, signed-in browser) when it is running
+    use_daemon = True
+    # Coupons API (the endpoints used by the `/cl/coupons/` page itself)
+    coupons_path = '/cl/api/coupons?couponsCountPerLoad=10000&sortType=relevance'
+    clip_path = '/cl/api/coupons/clip-unclip'
+    # Number of coupons per clip request, and number of clip requests in flight
+    clip_batch_size = 25
+    clip_concurrency = 4
+    # Receipts are synced from the site at most once per interval (seconds), otherwise read from the local store
+    receipts_sync_interval = 3600
+    receipts_path = '/mypurchases/api/v1/receipt/summary/by-user-id'
+    # Site and survey addresses, overridden to run against a local stand-in (see `benchmarks/standin.py`)
+    base_url = None
+    survey_url = 'https://www.krogerstoresfeedback.com/Index.aspx'
+    # Safety net: the survey is abandoned after this many pages (e.g. when a page keeps failing its validation)
+    survey_max_pages = 35
+    # `survey --all-eligible`: receipts older than this many days can't be surveyed anymore, surveys run at once
+    survey_window_days = 7
+    survey_concurrency = 3
+    # Drop the resources (images, fonts, trackers..) the commands don't need, per command (see `blocking.policies`)
+    block_requests = True
+    request_policies = blocking.policies
+    # Popups and overlays clicked away in the background as soon as they show up (see `popups.overlays`)
+    popup_overlays = popups.overlays
+    # Tabs kept open on the domain for the operations needing their own page (see `tabs.TabPool`), each one is
+    # recycled after that many checkouts
+    tab_pool_size = 3
+    tab_pool_max_uses = 20
+    # Failed steps (navigation, lookup, evaluation, fetch, sign in) are retried under these policies, restarting the
+    # browser is the last resort (see `retry.policies`)
+    retry_policies = retry.policies
 
     def __init__(self, cli):
         self.cli: kroger_cli.cli.KrogerCLI = cli
         self.browser = None
         self.page = None
+        self.request_blocker = None
+        self.request_policy = 'default'
+        self.popup_dismisser = None
+        self.tab_pool = None
+        self.retrier = retry.Retrier(self.retry_policies, retry.breakers)
         self._signed_in = False
 
     def complete_survey(self):
-        return asyncio.get_event_loop().run_until_complete(self._complete_survey())
+        return self._run('complete_survey')
+
+    def complete_all_surveys(self):
+        return self._run('complete_all_surveys')
 
     def close(self):
         """Close the browser and clean up. Call this when done with all operations."""
         if self.browser is not None:
             asyncio.get_event_loop().run_until_complete(self.destroy())
 
-    @memoized
+    @memoized(ttl=24 * 3600)
     def get_account_info(self):
-        return asyncio.get_event_loop().run_until_complete(self._get_account_info())
+        return self._run('get_account_info')
 
     @memoized
     def get_points_balance(self):
-        return asyncio.get_event_loop().run_until_complete(self._get_points_balance())
+        return self._run('get_points_balance')
 
     def clip_coupons(self):
-        return asyncio.get_event_loop().run_until_complete(self._clip_coupons())
+        return self._run('clip_coupons')
 
-    @memoized
-    def get_purchases_summary(self):
-        return asyncio.get_event_loop().run_until_complete(self._get_purchases_summary())
+    def sync_receipts(self, refresh=False):
+        """Sync the new receipts into the local store (unless synced recently). Returns the number of receipts added,
+        or None when the sync failed.
+        """
+        store = self.get_receipt_store()
+        try:
+            if not refresh and not store.is_stale(self.receipts_sync_interval):
+                # The local store is recent enough, no browser needed
+                return 0
+        finally:
+            store.close()
+
+        return self._run('sync_receipts')
+
+    def get_dashboard(self):
+        return self._run('get_dashboard')
+
+    def refresh_coupons_catalog(self):
+        return self._run('refresh_coupons_catalog')
+
+    def check_watchlist(self):
+        return self._run('check_watchlist')
+
+    def get_receipt_store(self):
+        """The local store of the account's receipts."""
+        return ReceiptStore(self.get_cache_namespace())
+
+    def get_coupons_catalog(self):
+        """The local coupons index (no browser needed to search it)."""
+        return CouponCatalog(self.get_cache_namespace())
+
+    def get_watchlist(self):
+        return Watchlist(self.get_cache_namespace())
+
+    def get_cache_namespace(self):
+        """Memoized results are kept apart per account and store domain."""
+        return self.cache_namespace + '|' + str(self.cli.username) + '|' + self.cli.config['main']['domain']
+
+    def _run(self, command):
+        """Run the `_<command>` coroutine: on the daemon when it is running, otherwise in this process."""
+        if self.use_daemon and self.browser is None and daemon.is_running():
+            try:
+                return daemon.request(command, self.cli.config_file)
+            except daemon.DaemonError as e:
+                self.cli.console.print('[italic]Daemon unavailable (' + str(e) + '), running locally..[/italic]')
+
+        result = asyncio.get_event_loop().run_until_complete(self.execute(command))
+        self._print_command_stats()
+        return result
+
+    async def execute(self, command):
+        """Run the `_<command>` coroutine in this process (from a running event loop: daemon, scheduler), under the
+        command's request policy and in its tracing span.
+        """
+        await self.set_request_policy(command)
+        with tracing.span(command):
+            return await getattr(self, '_' + command)()
+
+    async def set_request_policy(self, policy):
+        self.request_policy = policy
+        if self.request_blocker is not None:
+            await self.request_blocker.set_policy(policy)
+
+    def _print_command_stats(self):
+        """Blocked requests, tab reuse and dismissed popups of the command that just ran."""
+        if self.request_blocker is not None:
+            stats = self.request_blocker.get_stats()
+            self.request_blocker.reset_stats()
+            if stats['blocked']:
+                by_type = ', '.join(f'{resource_type}: {count}' for resource_type, count in
+                                    sorted(stats['blocked_by_type'].items(), key=lambda item: -item[1]))
+                self.cli.console.print(f'[italic]{stats["blocked"]} request(s) blocked ({by_type}), '
+                                       f'{stats["requests"]} request(s) / {stats["bytes_received"] / 2 ** 20:.1f} MB '
+                                       f'downloaded.[/italic]')
+
+        if self.tab_pool is not None:
+            stats = self.tab_pool.get_stats()
+            self.tab_pool.reset_stats()
+            if stats['checkouts']:
+                self.cli.console.print(f'[italic]{stats["checkouts"]} tab checkout(s), {stats["reused"]} on an '
+                                       f'already open tab.[/italic]')
+
+        if self.popup_dismisser is not None:
+            dismissed = self.popup_dismisser.get_stats()
+            self.popup_dismisser.reset_stats()
+            if dismissed:
+                by_overlay = ', '.join(f'{label}: {count}' for label, count in
+                                       sorted(dismissed.items(), key=lambda item: -item[1]))
+                self.cli.console.print(f'[italic]{sum(dismissed.values())} popup(s) dismissed '
+                                       f'({by_overlay}).[/italic]')
 
     async def _retrieve_feedback_url(self):
         self.cli.console.print('Loading `My Purchases` page (to retrieve the Feedback\'s Entry ID)')
 
-        # Modal overlay pop up (might not exist)
-        # Need to click on it, as it prevents me from clicking on `Order Details` link
-        try:
-            overlay = await self.page.select('.ModalitySelectorDynamicTooltip--Overlay')
-            if overlay:
-                await overlay.click()
-        except Exception:
-            pass
-
+        # The modal overlay hiding the `Order Details` link (when it shows up) is clicked away by the popup dismisser
         try:
             # `See Order Details` link
-            await self.page.wait(2)
-            details_btn = await self.page.select('.PurchaseCard-top-view-details-button a')
+            await readiness.wait_for_selector(self.page, '.PurchaseCard-top-view-details-button a', self.page_timeout)
+            details_btn = await self.retrier.call(
+                'select', lambda: self.page.select('.PurchaseCard-top-view-details-button a'))
             if details_btn:
                 await details_btn.click()
-                await self.page.wait(2)
+                await readiness.wait_for_network_idle(self.page, self.page_timeout)
 
             # `View Receipt` link
-            receipt_btn = await self.page.select('.PurchaseCard-top-view-details-button a')
+            receipt_btn = await self.retrier.call(
+                'select', lambda: self.page.select('.PurchaseCard-top-view-details-button a'))
             if receipt_btn:
                 await receipt_btn.click()
-                await self.page.wait(2)
+                await readiness.wait_for_text(self.page, 'Entry ID', self.page_timeout)
 
-            content = await self.page.get_content()
+            fields = await extract.extract(self.page, extract.receipt_fields)
         except Exception:
-            link = 'https://www.' + self.cli.config['main']['domain'] + '/mypurchases'
+            link = self._url('/mypurchases')
             self.cli.console.print('[bold red]Couldn\'t retrieve the latest purchase, please make sure it exists: '
                                    '[link=' + link + ']' + link + '[/link][/bold red]')
             raise Exception
 
-        try:
-            match = re.search('Entry ID: (.*?) ', content)
-            entry_id = match[1]
-            match = re.search('Date: (.*?) ', content)
-            entry_date = match[1]
-            match = re.search('Time: (.*?) ', content)
-            entry_time = match[1]
-            self.cli.console.print('Entry ID retrieved: ' + entry_id)
-        except Exception:
+        entry = self._parse_feedback_entry(fields)
+        if entry is None:
             current_url = self.page.url if hasattr(self.page, 'url') else 'unknown'
             self.cli.console.print('[bold red]Couldn\'t retrieve Entry ID from the receipt, please make sure it exists: '
                                    '[link=' + current_url + ']' + current_url + '[/link][/bold red]')
             raise Exception
 
+        self.cli.console.print('Entry ID retrieved: ' + entry['entry_id'])
+        return entry
+
+    def _parse_feedback_entry(self, fields):
+        """From the Entry ID, date and time printed on a receipt (see `extract.receipt_fields`), returns the survey URL
+        and details, or None.
+        """
+        entry_id, entry_time = fields.get('entry_id'), fields.get('time')
+        try:
+            date = datetime.datetime.strptime(fields.get('date'), '%m/%d/%y')
+        except Exception:
+            return None
+        if not entry_id or not entry_time:
+            return None
+
         entry = entry_id.split('-')
+        if len(entry) < 6:
+            return None
         hour = entry_time[0:2]
         minute = entry_time[3:5]
         meridian = entry_time[5:7].upper()
-        date = datetime.datetime.strptime(entry_date, '%m/%d/%y')
-        full_date = date.strftime('%m/%d/%Y')
         month = date.strftime('%m')
         day = date.strftime('%d')
         year = date.strftime('%Y')
 
-        url = f'https://www.krogerstoresfeedback.com/Index.aspx?' \
+        url = f'{self.survey_url}?' \
               f'CN1={entry[0]}&CN2={entry[1]}&CN3={entry[2]}&CN4={entry[3]}&CN5={entry[4]}&CN6={entry[5]}&' \
               f'Index_VisitDateDatePicker={month}%2f{day}%2f{year}&' \
               f'InputHour={hour}&InputMeridian={meridian}&InputMinute={minute}'
 
-        return url, full_date
+        return {'entry_id': entry_id, 'date': date, 'survey_date': date.strftime('%m/%d/%Y'), 'url': url}
 
     async def _complete_survey(self):
         signed_in = await self.ensure_signed_in()
@@ -114,72 +261,132 @@ class KrogerAPI:
         await self.navigate_to('/mypurchases')
 
         try:
-            url, survey_date = await self._retrieve_feedback_url()
+            entry = await self._retrieve_feedback_url()
         except Exception:
             return None
 
-        # Navigate to survey page (external site)
-        self.page = await self.browser.get(url)
-        await self.page
-        await self.page.wait(3)
-
-        # Wait for date picker and set the date
-        try:
-            date_picker = await self.page.select('#Index_VisitDateDatePicker')
-            if date_picker:
-                # We need to manually set the date, otherwise the validation fails
-                js = "() => {$('#Index_VisitDateDatePicker').datepicker('setDate', '" + survey_date + "');}"
-                await self.page.evaluate(js)
-
-            next_btn = await self.page.select('#NextButton')
-            if next_btn:
-                await next_btn.click()
-        except Exception:
-            pass
+        completed = await self._run_survey(self.page, entry['url'], entry['survey_date'])
+        if completed:
+            # Remembered, so `--all-eligible` runs don't submit it again
+            ledger = Ledger('completed-surveys', self.get_cache_namespace())
+            try:
+                ledger.add([entry['entry_id']])
+            finally:
+                ledger.close()
+        return completed
+
+    async def _complete_all_surveys(self):
+        """Complete the survey of every recent receipt (within `survey_window_days`) not completed yet.
+        Receipts are read and surveys run in their own tabs, `survey_concurrency` at a time.
+        """
+        signed_in = await self.ensure_signed_in()
+        if not signed_in:
+            return None
 
-        for i in range(35):
-            await self.page.wait(2)
-            current_url = self.page.url if hasattr(self.page, 'url') else ''
+        page = await self.navigate_to('/mypurchases', wait_for='.PurchaseCard-top-view-details-button a')
+        links = await self.retrier.call('evaluate', lambda: page.evaluate(
+            'Array.from(document.querySelectorAll(".PurchaseCard-top-view-details-button a"), (link) => link.href)'))
+        links = list(dict.fromkeys(links or []))
+        self.cli.console.print('[italic]' + str(len(links)) + ' recent purchase(s) found, checking their '
+                               'receipts..[/italic]')
+
+        result = {'completed': 0, 'failed': 0, 'skipped': 0}
+        # Receipts only carry the day of the purchase, the window is compared in days
+        oldest = datetime.date.today() - datetime.timedelta(days=self.survey_window_days)
+        semaphore = asyncio.Semaphore(self.survey_concurrency)
+        ledger = Ledger('completed-surveys', self.get_cache_namespace())
+
+        async def complete(link):
+            async with semaphore, self.get_tab_pool().checkout() as tab:
+                try:
+                    await tab.get(link)
+                    entry = await self._get_receipt_entry(tab)
+                    # No Entry ID on the receipt (e.g. not eligible to the survey): nothing to complete
+                    if entry is None:
+                        result['skipped'] += 1
+                        return
+                    if entry['date'].date() < oldest or entry['entry_id'] in ledger:
+                        result['skipped'] += 1
+                        return
+
+                    self.cli.console.print('Completing the survey for Entry ID ' + entry['entry_id'] + '..')
+                    if await self._run_survey(tab, entry['url'], entry['survey_date']):
+                        ledger.add([entry['entry_id']])
+                        result['completed'] += 1
+                    else:
+                        result['failed'] += 1
+                except Exception as e:
+                    result['failed'] += 1
+                    self.cli.console.print('[bold red]' + link + ': ' + (str(e) or e.__class__.__name__) +
+                                           '[/bold red]')
 
+        try:
+            await asyncio.gather(*[complete(link) for link in links])
+        finally:
+            ledger.close()
+
+        return result
+
+    async def _get_receipt_entry(self, tab):
+        """From an order details page, open the receipt and read its survey entry (see `_parse_feedback_entry`)."""
+        selector = '.PurchaseCard-top-view-details-button a'
+        await readiness.wait_for_selector(tab, selector, self.page_timeout)
+        receipt_link = await tab.evaluate('document.querySelector(' + json.dumps(selector) + ').href')
+        await tab.get(receipt_link)
+        if not await readiness.wait_for_text(tab, 'Entry ID', self.page_timeout):
+            return None
+        return self._parse_feedback_entry(await extract.extract(tab, extract.receipt_fields))
+
+    async def _run_survey(self, page, url, survey_date):
+        """Open the survey in `page` and wait for it to finish. Returns True once the finish page is reached."""
+        # The survey fills and submits itself (see `helper.get_survey_autopilot_js`), every page reports back
+        # through a binding, so it goes as fast as the survey site answers
+        from zendriver import cdp
+        events = asyncio.Queue()
+        binding = '__krogerSurvey'
+        url_prefix = self.survey_url.rsplit('/', 1)[0] + '/'
+
+        def on_binding_called(event):
+            if event.name == binding:
+                events.put_nowait(json.loads(event.payload))
+
+        page.add_handler(cdp.runtime.BindingCalled, on_binding_called)
+        await page.send(cdp.runtime.add_binding(binding))
+        script = await page.send(cdp.page.add_script_to_evaluate_on_new_document(
+            helper.get_survey_autopilot_js(self.cli.config, survey_date, url_prefix, binding, self.page_timeout)))
+        try:
+            await page.get(url)
+            for i in range(self.survey_max_pages):
+                with tracing.span('survey page', page=i):
+                    try:
+                        event = await asyncio.wait_for(events.get(), self.page_timeout)
+                    except asyncio.TimeoutError:
+                        return False
+                if event['event'] == 'finished':
+                    return True
+                if event['event'] == 'stuck':
+                    return False
+            return False
+        finally:
+            page.remove_handlers(cdp.runtime.BindingCalled, on_binding_called)
             try:
-                next_btn = await self.page.select('#NextButton')
-                if not next_btn:
-                    if 'Finish' in current_url:
-                        return True
-                    continue
-
-                await self.page.evaluate(helper.get_survey_injection_js(self.cli.config))
-                await next_btn.click()
+                await page.send(cdp.page.remove_script_to_evaluate_on_new_document(script))
+                await page.send(cdp.runtime.remove_binding(binding))
             except Exception:
-                if 'Finish' in current_url:
-                    return True
-
-        return False
+                pass
 
-    async def _get_account_info(self):
+    async def _get_account_info(self, page=None):
         # Sign in (will skip if already signed in)
         signed_in = await self.ensure_signed_in()
         if not signed_in:
             return None
 
         self.cli.console.print('Loading profile info..')
-        await self.navigate_to('/account/update')
+        page = await self.navigate_to('/account/update', wait_for='[data-qa="Current Email: -value"]', page=page)
 
-        profile = {}
         try:
-            # Scrape profile data from the page using data-qa selectors
-            email_elem = await self.page.find('[data-qa="Current Email: -value"]')
-            if email_elem:
-                profile['emailAddress'] = email_elem.text
-
-            card_elem = await self.page.find('[data-qa="Current Value Card Number: -value"]')
-            if card_elem:
-                profile['loyaltyCardNumber'] = card_elem.text
-
-            alt_id_elem = await self.page.find('[data-qa="Current Alt ID: -value"]')
-            if alt_id_elem:
-                profile['alternateId'] = alt_id_elem.text
-
+            # Every field of the page (data-qa selectors) in one evaluation, the missing ones come back as None
+            profile = await extract.extract(page, extract.profile_fields)
         except Exception as e:
             print("EXCEPTION")
             print(e)
@@ -187,28 +394,130 @@ class KrogerAPI:
 
         return profile
 
-    async def _get_points_balance(self):
+    async def _get_points_balance(self, page=None):
         signed_in = await self.ensure_signed_in()
         if not signed_in:
             return None
 
         self.cli.console.print('Loading points balance..')
-        await self.navigate_to('/accountmanagement/api/points-summary')
         try:
-            content = await self.page.get_content()
-            balance = self._get_json_from_page_content(content)
+            balance = await self.fetch_json('/accountmanagement/api/points-summary', page=page)
             program_balance = balance[0]['programBalance']['balance']
         except Exception:
             balance = None
 
         return balance
 
+    async def _get_coupons(self, page=None):
+        """List all the available digital coupons (see `helper.parse_coupons`). Returns None on failure."""
+        coupons = []
+        try:
+            async for items in self.fetch_json_items(self.coupons_path, ('data', 'coupons'), page=page):
+                coupons += helper.parse_coupons(items)
+        except ValueError:
+            # Not the usual `{'data': {'coupons': ..}}` shape, decode the whole response instead
+            try:
+                coupons = helper.parse_coupons(await self.fetch_json(self.coupons_path, page=page))
+            except Exception:
+                return None
+        except Exception:
+            return None
+
+        return coupons
+
+    async def _refresh_coupons_catalog(self):
+        signed_in = await self.ensure_signed_in()
+        if not signed_in:
+            return None
+
+        self.cli.console.print('[italic]Loading the coupons..[/italic]')
+        coupons = await self._get_coupons()
+        if not coupons:
+            return None
+
+        catalog = self.get_coupons_catalog()
+        try:
+            return catalog.refresh(coupons)
+        finally:
+            catalog.close()
+
+    async def _check_watchlist(self):
+        signed_in = await self.ensure_signed_in()
+        if not signed_in:
+            return None
+
+        self.cli.console.print('[italic]Loading the coupons..[/italic]')
+        coupons = await self._get_coupons()
+        if not coupons:
+            return None
+
+        catalog = self.get_coupons_catalog()
+        watchlist = self.get_watchlist()
+        try:
+            catalog.refresh(coupons)
+            return watchlist.check(coupons)
+        finally:
+            catalog.close()
+            watchlist.close()
+
     async def _clip_coupons(self):
         signed_in = await self.ensure_signed_in()
         if not signed_in:
             return None
 
-        await self.navigate_to('/cl/coupons/')
+        start = time.perf_counter()
+        self.cli.console.print('[italic]Loading the coupons..[/italic]')
+        coupons = await self._get_coupons()
+        if not coupons:
+            self.cli.console.print('[italic]Couldn\'t load the coupons list, clipping them from the page..[/italic]')
+            await self._clip_coupons_on_page()
+            # Nothing is known about what was clipped
+            return {'clipped': None, 'failed': 0, 'skipped': 0, 'elapsed': time.perf_counter() - start,
+                    'on_page': True}
+
+        catalog = self.get_coupons_catalog()
+        try:
+            # The listing is at hand anyway, keep the local coupons index up to date
+            catalog.refresh(coupons)
+
+            # The listing is authoritative: a coupon it reports as not on the card (removed on the site or the app,
+            # a clip the server dropped) is clipped again. A coupon listed twice is requested once.
+            coupon_ids = list(dict.fromkeys(coupon['id'] for coupon in coupons if not coupon['clipped']))
+
+            self.cli.console.print('[italic]Clipping ' + str(len(coupon_ids)) + ' new coupon(s), please wait..[/italic]')
+            batches = [coupon_ids[i:i + self.clip_batch_size] for i in range(0, len(coupon_ids), self.clip_batch_size)]
+            semaphore = asyncio.Semaphore(self.clip_concurrency)
+            await self._get_origin_page()
+
+            async def clip(batch):
+                async with semaphore:
+                    try:
+                        response = await self.fetch_json(self.clip_path, 'POST', body={
+                            'clipRequests': [{'clipAction': 'CLIP', 'couponId': coupon_id} for coupon_id in batch]
+                        })
+                    except Exception:
+                        return 0
+                    # Only the clips the response confirms are recorded, the others show up again in the listing
+                    confirmed = [coupon_id for coupon_id in batch
+                                 if coupon_id in helper.get_clipped_ids(response, batch)]
+                    catalog.set_clipped(confirmed)
+                    return len(confirmed)
+
+            clipped = sum(await asyncio.gather(*[clip(batch) for batch in batches]))
+        finally:
+            catalog.close()
+
+        return {
+            'clipped': clipped,
+            'failed': len(coupon_ids) - clipped,
+            'skipped': len(set(coupon['id'] for coupon in coupons)) - len(coupon_ids),
+            'elapsed': time.perf_counter() - start,
+            'on_page': False,
+        }
+
+    async def _clip_coupons_on_page(self):
+        """Fallback: click the first 150 `Clip` buttons of the coupons page."""
+        await self.navigate_to('/cl/coupons/', wait_for='.kds-Button--favorable')
 
         js = """
             window.scrollTo(0, document.body.scrollHeight);
@@ -223,44 +532,74 @@ class KrogerAPI:
 
         self.cli.console.print('[italic]Applying the coupons, please wait..[/italic]')
 
-        # Dismiss any popup by pressing Escape
-        try:
-            body = await self.page.select('body')
-            if body:
-                await body.send_keys(zd.SpecialKeys.ESCAPE)
-        except Exception:
-            pass
-
         for i in range(6):
             await self.page.evaluate(js)
             await self.page.scroll_down(500)
-            await self.page.wait(1)
-        await self.page.wait(3)
-        self.cli.console.print('[bold]Coupons successfully clipped to your account! :thumbs_up:[/bold]')
+            # Let the lazily loaded coupons (and the clip requests) settle before the next pass
+            await readiness.wait_for_network_idle(self.page, 3)
+        await readiness.wait_for_network_idle(self.page, self.page_timeout)
 
-    async def _get_purchases_summary(self):
+    async def _sync_receipts(self, page=None):
         signed_in = await self.ensure_signed_in()
         if not signed_in:
             return None
 
         self.cli.console.print('Loading your purchases..')
-        await self.navigate_to('/mypurchases/api/v1/receipt/summary/by-user-id')
+        store = self.get_receipt_store()
         try:
-            content = await self.page.get_content()
-            data = self._get_json_from_page_content(content)
+            # Receipts are written to the store batch by batch, while the response is still being received
+            sync = store.start_sync()
+            async for receipts in self.fetch_json_items(self.receipts_path, page=page):
+                sync.add(receipts)
+            sync.finish()
         except Exception:
-            data = None
+            return None
+        finally:
+            store.close()
+
+        self.cli.console.print(str(sync.added) + ' new receipt(s) synced.')
+        return sync.added
+
+    async def _get_dashboard(self):
+        """Gather account info, points balance and purchases concurrently on one signed-in browser."""
+        signed_in = await self.ensure_signed_in()
+        if not signed_in:
+            return None
+
+        # The profile is scraped from a rendered page, so it gets its own tab; the JSON endpoints are
+        # fetched from the main tab, the in-page requests run concurrently
+        await self._get_origin_page()
+        async with self.get_tab_pool().checkout() as profile_tab:
+            account_info, points_balance, receipts_synced = await asyncio.gather(
+                self._get_account_info(page=profile_tab),
+                self._get_points_balance(),
+                self._sync_receipts(),
+            )
 
-        return data
+        return {
+            'account_info': account_info,
+            'points_balance': points_balance,
+            'receipts_synced': receipts_synced,
+        }
 
+    @tracing.traced()
     async def init(self):
         # Only start browser if not already running
         if self.browser is None:
+            # The browser driver is heavy to import, commands answered from the cache never need it
+            import zendriver as zd
+            if tracing.is_enabled():
+                tracing.instrument(zd.Tab, ['get', 'find', 'select', 'select_all', 'evaluate', 'wait'])
             self.browser = await zd.start(
                 headless=self.headless,
                 user_data_dir=self.user_data_dir
             )
             self.page = None
+            if self.block_requests:
+                self.request_blocker = blocking.RequestBlocker(self.request_policies, self.request_policy)
+                await self.request_blocker.attach(self.browser.main_tab)
+            self.popup_dismisser = popups.PopupDismisser(self.popup_overlays)
+            await self.popup_dismisser.attach(self.browser.main_tab)
 
     async def destroy(self):
         if self.browser:
@@ -269,8 +608,27 @@ class KrogerAPI:
             await asyncio.sleep(1)
             self.browser = None
             self.page = None
+            self.request_blocker = None
+            self.popup_dismisser = None
+            self.tab_pool = None
             self._signed_in = False
 
+    def invalidate_session(self):
+        """Forget that the browser is signed in: the next command probes the session again (and signs in if it
+        expired), e.g. in long running processes.
+        """
+        self._signed_in = False
+
+    def get_tab_pool(self):
+        """The pool of tabs on the configured domain (created empty, tabs are opened on demand or by `fill`)."""
+        if self.tab_pool is None:
+            extensions = [extension for extension in (self.request_blocker, self.popup_dismisser)
+                          if extension is not None]
+            self.tab_pool = TabPool(self.browser, self._url('/robots.txt'), self.tab_pool_size,
+                                    self.tab_pool_max_uses, extensions, self.probe_timeout)
+        return self.tab_pool
+
+    @tracing.traced()
     async def ensure_signed_in(self):
         """Ensure browser is running and user is signed in. Only signs in once per session."""
         await self.init()
@@ -278,15 +636,27 @@ class KrogerAPI:
         if self._signed_in:
             return True
 
-        self.cli.console.print('[italic]Signing in.. (please wait, it might take awhile)[/italic]')
-        signed_in = await self.sign_in()
+        # The persisted profile (`user_data_dir`) might still hold a valid session from the last run
+        if await self.is_authenticated():
+            self._signed_in = True
+            return True
 
-        if not signed_in and self.headless:
-            self.cli.console.print('[red]Sign in failed. Trying one more time..[/red]')
-            self.headless = False
-            await self.destroy()
-            await self.init()
-            signed_in = await self.sign_in()
+        self.cli.console.print('[italic]Signing in.. (please wait, it might take awhile)[/italic]')
+        policy = self.request_policy
+        await self.set_request_policy('sign_in')
+        try:
+            # Only the transient errors are retried in the same browser, rejected credentials aren't submitted
+            # again. A restart (showing the browser) comes last
+            signed_in = await self._retry_sign_in()
+
+            if not signed_in and self.headless:
+                self.cli.console.print('[red]Sign in failed. Trying one more time..[/red]')
+                self.headless = False
+                await self.destroy()
+                await self.init()
+                signed_in = await self._retry_sign_in()
+        finally:
+            await self.set_request_policy(policy)
 
         if not signed_in:
             self.cli.console.print('[bold red]Sign in failed. Please make sure the username/password is correct.'
@@ -296,40 +666,97 @@ class KrogerAPI:
 
         return signed_in
 
-    async def navigate_to(self, path):
-        """Navigate to a page on the configured domain."""
-        url = 'https://www.' + self.cli.config['main']['domain'] + path
-        self.page = await self.browser.get(url)
-        await self.page
-        await self.page.wait(2)
-        return self.page
+    async def _retry_sign_in(self):
+        """`sign_in` with its transient errors retried (see `retry.policies`), False once they're exhausted."""
+        try:
+            return await self.retrier.call('sign_in', self.sign_in)
+        except Exception:
+            return False
 
-    async def sign_in(self):
-        """Perform the sign-in flow. Returns True if successful."""
-        timeout = 20 if self.headless else 10  # seconds
+    @tracing.traced()
+    async def is_authenticated(self):
+        """Cheap probe: the points summary API answers with JSON only when the session is valid."""
+        try:
+            data = await asyncio.wait_for(self.fetch_json('/accountmanagement/api/points-summary'),
+                                          self.probe_timeout)
+        except Exception:
+            return False
 
-        # Navigate to sign-in page
-        sign_in_url = 'https://www.' + self.cli.config['main']['domain'] + '/signin?redirectUrl=/account/update'
-        self.page = await self.browser.get(sign_in_url)
-        await self.page
-        await self.page.wait(2)
+        return isinstance(data, list)
 
-        try:
-            # Dismiss any popups that may appear
-            try:
-                dismissbtn = await self.page.find('Dismiss', timeout=3)
-                if dismissbtn:
-                    await dismissbtn.click()
-            except Exception:
-                pass
+    async def fetch_json(self, path, method='GET', headers=None, body=None, page=None):
+        """Call a JSON endpoint of the configured domain from inside the browser (no tab navigation)."""
+        url = self._url(path)
+
+        async def fetch():
+            origin_page = await self._get_origin_page(page)
+            return await transport.fetch_json(origin_page, url, method, headers, body)
+
+        return await self.retrier.call('fetch', fetch, self._get_domain(url))
+
+    async def fetch_json_items(self, path, item_path=(), method='GET', headers=None, body=None, page=None):
+        """Same as `fetch_json`, but yields lists of the items found at `item_path` as the response arrives."""
+        page = await self._get_origin_page(page)
+        async for items in transport.fetch_json_items(page, self._url(path), item_path, method, headers, body):
+            yield items
 
+    async def _get_origin_page(self, page=None):
+        """Return a tab on the configured domain, so in-page requests are same-origin and carry the cookies."""
+        origin = self._url('')
+        current = page if page is not None else self.page
+        if current is not None:
             try:
-                closepop = await self.page.find('Close pop-up', timeout=2)
-                if closepop:
-                    await closepop.click()
+                if await current.evaluate('location.origin') == origin:
+                    return current
             except Exception:
                 pass
 
+        # Smallest page available on the domain
+        return await self.navigate_to('/robots.txt', page=page)
+
+    @staticmethod
+    def _get_domain(url):
+        return urllib.parse.urlsplit(url).netloc
+
+    def _url(self, path):
+        if self.base_url:
+            return self.base_url + path
+        return 'https://www.' + self.cli.config['main']['domain'] + path
+
+    async def navigate_to(self, path, wait_for=None, page=None):
+        """Navigate to a page on the configured domain (in the main tab, unless `page` is given).
+        Waits for the `wait_for` selector if given, for the JSON body on API endpoints, otherwise for the DOM.
+        """
+        url = self._url(path)
+        with tracing.span('navigate_to', path=path):
+            if page is None:
+                self.page = page = await self.retrier.call('navigate', lambda: self.browser.get(url),
+                                                           self._get_domain(url))
+            else:
+                await self.retrier.call('navigate', lambda: page.get(url), self._get_domain(url))
+
+            if wait_for is not None:
+                await readiness.wait_for_selector(page, wait_for, self.page_timeout)
+            elif '/api/' in path:
+                await readiness.wait_for_json(page, self.page_timeout)
+            else:
+                await readiness.wait_for_load(page, self.page_timeout)
+        return page
+
+    @tracing.traced()
+    async def sign_in(self):
+        """Perform the sign-in flow. Returns True if successful, False when the sign in is rejected. The transient
+        errors (see `retry.is_transient`) are raised, to be retried.
+        """
+        import zendriver as zd
+        timeout = self.page_timeout  # seconds
+
+        # Navigate to sign-in page
+        self.page = await self.browser.get(self._url('/signin?redirectUrl=/account/update'))
+        await readiness.wait_for_selector(self.page, '#signInName', timeout)
+
+        try:
+            # Popups (`Dismiss`, `Close pop-up`) are clicked away in the background by the popup dismisser
             # Find and fill email field
             email_field = await self.page.find('signInName')
             if email_field:
@@ -343,12 +770,19 @@ class KrogerAPI:
                 await password_field.click()
                 await password_field.clear_input()
                 await password_field.send_keys(self.cli.password)
+                sign_in_url = await self.page.evaluate('location.href')
                 await password_field.send_keys(zd.SpecialKeys.ENTER)
 
-            # Wait for navigation/login to complete
-            await self.page.wait(timeout)
+                # The form is submitted: still on the sign in page once the time out is over, it was rejected
+                if not await readiness.wait_for_url_change(self.page, sign_in_url, timeout):
+                    return False
 
-        except Exception:
+            # Wait for the redirect to the profile page (login complete)
+            await readiness.wait_for_text(self.page, 'Profile Information', timeout)
+
+        except Exception as e:
+            if retry.is_transient(e):
+                raise
             return False
 
         # Verify login success by checking page content
@@ -356,11 +790,9 @@ class KrogerAPI:
             content = await self.page.get_content()
             if 'Profile Information' not in content:
                 return False
-        except Exception:
+        except Exception as e:
+            if retry.is_transient(e):
+                raise
             return False
 
         return True
-
-    def _get_json_from_page_content(self, content):
-        match = re.search('<pre.*?>(.*?)</pre>', content)
-        return json.loads(match[1])
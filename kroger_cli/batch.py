@@ -0,0 +1,131 @@
+import asyncio
+import configparser
+import io
+import os
+import time
+from rich.console import Console
+from rich.table import Table
+from kroger_cli.cli import KrogerCLI
+from kroger_cli import helper
+
+
+class BatchRunner:
+    """Runs a command across every account of an accounts file, using a bounded pool of browsers.
+
+    The accounts file is an ini file with one section per account:
+
+        [household]
+        username = someone@example.com
+        password = secret
+        domain = kroger.com
+
+    Each account gets its own working directory (config, browser profile and cache namespace).
+    """
+
+    accounts_dir = '.accounts'
+
+    def __init__(self, accounts_file, workers=None, console=None):
+        self.accounts_file = accounts_file
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.console = console if console is not None else Console()
+        self.accounts = configparser.ConfigParser()
+        self.accounts.read(accounts_file)
+
+    def run(self, command):
+        results = asyncio.get_event_loop().run_until_complete(self._run(command))
+        self.print_results(command, results)
+        return results
+
+    async def _run(self, command):
+        semaphore = asyncio.Semaphore(self.workers)
+        self.console.print('Running `' + command + '` for ' + str(len(self.accounts.sections())) + ' account(s), '
+                           + str(self.workers) + ' at a time..')
+
+        async def run_account(name):
+            async with semaphore:
+                return await self._run_account(name, command)
+
+        return await asyncio.gather(*[run_account(name) for name in self.accounts.sections()])
+
+    async def _run_account(self, name, command):
+        start = time.perf_counter()
+        result = {'account': name, 'ok': False, 'summary': '', 'elapsed': 0.0}
+        cli = None
+        try:
+            cli = self._create_cli(name)
+            result['ok'], result['summary'] = await self._run_command(cli, command)
+        except Exception as e:
+            result['summary'] = str(e) or e.__class__.__name__
+        finally:
+            if cli is not None:
+                await cli.api.destroy()
+            result['elapsed'] = time.perf_counter() - start
+
+        return result
+
+    async def _run_command(self, cli, command):
+        api = cli.api
+        if command == 'points-balance':
+            balance = await api.execute('get_points_balance')
+            if balance is None or len(balance) == 1:
+                return False, 'Couldn\'t retrieve the points balance'
+            return True, ', '.join(item['programDisplayInfo']['loyaltyProgramName'] + ': ' +
+                                   item['programBalance']['balanceDescription'] for item in balance[1:])
+        elif command == 'clip-coupons':
+            result = await api.execute('clip_coupons')
+            if result is None:
+                return False, 'Sign in failed'
+            if result['on_page']:
+                return True, 'Coupons clipped from the page'
+            return result['failed'] == 0, (str(result['clipped']) + ' clipped, ' + str(result['skipped']) +
+                                           ' already clipped, ' + str(result['failed']) + ' failed')
+        elif command == 'survey':
+            missing = [field for field in helper.survey_mandatory_fields if cli.config['profile'].get(field, '') == '']
+            if missing:
+                return False, 'Missing profile fields: ' + ', '.join(missing)
+            result = await api.execute('complete_survey')
+            return result is True, 'Survey completed' if result is True else 'Couldn\'t complete the survey'
+
+        raise ValueError('Unknown command: ' + command)
+
+    def _create_cli(self, name):
+        account = self.accounts[name]
+        account_dir = os.path.join(self.accounts_dir, name)
+        os.makedirs(account_dir, exist_ok=True)
+
+        config_file = os.path.join(account_dir, 'config.ini')
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        for section in ('main', 'profile'):
+            if not config.has_section(section):
+                config.add_section(section)
+        config['main']['username'] = account['username']
+        config['main']['password'] = account['password']
+        config['main']['domain'] = account.get('domain', 'kroger.com')
+        if 'first_name' not in config['profile']:
+            config['profile']['first_name'] = ''
+        # Survey details can be provided in the accounts file as well
+        for field in helper.survey_mandatory_fields + ['address_line2']:
+            if field in account:
+                config['profile'][field] = account[field]
+        with open(config_file, 'w') as f:
+            config.write(f)
+
+        # Accounts run concurrently, so their output is kept out of the shared terminal
+        cli = KrogerCLI(config_file=config_file, console=Console(file=io.StringIO()))
+        cli.api.user_data_dir = os.path.join(account_dir, 'user-data')
+        cli.api.cache_namespace = name
+        return cli
+
+    def print_results(self, command, results):
+        table = Table(title='Batch `' + command + '` results')
+        table.add_column('Account')
+        table.add_column('Status')
+        table.add_column('Result')
+        table.add_column('Time')
+
+        for result in results:
+            status = '[green]OK[/green]' if result['ok'] else '[red]FAILED[/red]'
+            table.add_row(result['account'], status, result['summary'], f'{result["elapsed"]:.1f}s')
+
+        self.console.print(table)
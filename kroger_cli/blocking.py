@@ -0,0 +1,102 @@
+import fnmatch
+
+# Ads, analytics and tag managers loaded by the storefront, none of them is needed to read the DOM or the JSON
+trackers = [
+    '*google-analytics.com/*', '*googletagmanager.com/*', '*doubleclick.net/*', '*googlesyndication.com/*',
+    '*googleadservices.com/*', '*facebook.net/*', '*facebook.com/tr*', '*adobedtm.com/*', '*omtrdc.net/*',
+    '*demdex.net/*', '*everesttech.net/*', '*quantummetric.com/*', '*bat.bing.com/*', '*pinterest.com/*',
+    '*criteo.com/*', '*criteo.net/*', '*tiktok.com/*', '*hotjar.com/*', '*qualtrics.com/*',
+]
+
+# Request policy per command (`default` for the others). The sign in keeps every script: the bot protection has
+# to run, so only the heavy static resources are dropped there.
+policies = {
+    'default': {'resource_types': ['Image', 'Media', 'Font', 'Ping'], 'url_patterns': trackers},
+    'sign_in': {'resource_types': ['Image', 'Media', 'Font'], 'url_patterns': []},
+}
+
+
+class RequestBlocker:
+    """Fails the requests matching the current policy (resource types and URL patterns) through the CDP Fetch domain,
+    and counts what was blocked and what was downloaded.
+    """
+
+    def __init__(self, policies, policy='default'):
+        self.policies = policies
+        self.policy = policy
+        self.tabs = []
+        self.blocked = {}
+        self.requests = 0
+        self.bytes_received = 0
+
+    def get_policy(self):
+        return self.policies.get(self.policy) or self.policies['default']
+
+    async def attach(self, tab):
+        from zendriver import cdp
+        if tab in self.tabs:
+            return
+        self.tabs.append(tab)
+        # Fetch is enabled explicitly (with the policy's patterns) before its handler is registered
+        await self._apply(tab)
+        tab.add_handler(cdp.fetch.RequestPaused, self._on_request_paused)
+        tab.add_handler(cdp.network.LoadingFinished, self._on_loading_finished)
+
+    def detach(self, tab):
+        if tab in self.tabs:
+            self.tabs.remove(tab)
+
+    async def set_policy(self, policy):
+        """Switch the policy (e.g. for the command about to run) on every attached tab."""
+        if policy == self.policy:
+            return
+        self.policy = policy
+        for tab in list(self.tabs):
+            try:
+                await self._apply(tab)
+            except Exception:
+                # Closed tab
+                self.detach(tab)
+
+    async def _apply(self, tab):
+        from zendriver import cdp
+        policy = self.get_policy()
+        patterns = [cdp.fetch.RequestPattern(url_pattern='*', resource_type=cdp.network.ResourceType(resource_type))
+                    for resource_type in policy['resource_types']]
+        patterns += [cdp.fetch.RequestPattern(url_pattern=url_pattern) for url_pattern in policy['url_patterns']]
+        await tab.send(cdp.fetch.enable(patterns=patterns))
+
+    def is_blocked(self, resource_type, url):
+        policy = self.get_policy()
+        return (resource_type in policy['resource_types'] or
+                any(fnmatch.fnmatchcase(url, url_pattern) for url_pattern in policy['url_patterns']))
+
+    async def _on_request_paused(self, event, tab):
+        from zendriver import cdp
+        resource_type = event.resource_type.value
+        try:
+            if self.is_blocked(resource_type, event.request.url):
+                self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+                await tab.send(cdp.fetch.fail_request(event.request_id, cdp.network.ErrorReason.BLOCKED_BY_CLIENT))
+            else:
+                # Paused under a previous policy
+                await tab.send(cdp.fetch.continue_request(event.request_id))
+        except Exception:
+            pass
+
+    def _on_loading_finished(self, event):
+        self.requests += 1
+        self.bytes_received += event.encoded_data_length
+
+    def get_stats(self):
+        return {
+            'blocked': sum(self.blocked.values()),
+            'blocked_by_type': dict(self.blocked),
+            'requests': self.requests,
+            'bytes_received': self.bytes_received,
+        }
+
+    def reset_stats(self):
+        self.blocked = {}
+        self.requests = 0
+        self.bytes_received = 0
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import sqlite3
+import time
+from kroger_cli import database
+
+fields = ['brand', 'description', 'value', 'expiration_date', 'category', 'clipped']
+# Fields of the content hash: `clipped` is left out, clipping a coupon doesn't change the offer
+content_fields = [field for field in fields if field != 'clipped']
+
+
+def get_content_hash(coupon):
+    return hashlib.sha1(json.dumps([coupon.get(field) for field in content_fields]).encode()).hexdigest()
+
+
+def get_unique(coupons):
+    """The coupons of a listing, once per ID (the last one listed wins), in the listing's order."""
+    return list(dict((coupon['id'], coupon) for coupon in coupons).values())
+
+
+class CouponCatalog:
+    """Local index of the available coupons of an account, with full-text search (SQLite FTS5).
+    Refreshes are incremental: only new or changed coupons are written, the ones gone from the listing are expired
+    (and deleted `expired_retention` seconds later).
+    """
+
+    expired_retention = 30 * 24 * 3600
+
+    def __init__(self, namespace, path=None):
+        self.namespace = namespace
+        self.connection = database.connect(path)
+        self.has_fts = True
+        self._init_tables()
+
+    def _init_tables(self):
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS coupons (namespace TEXT NOT NULL, id TEXT NOT NULL, '
+                                    'brand TEXT, description TEXT, value REAL, expiration_date TEXT, category TEXT, '
+                                    'clipped INTEGER NOT NULL DEFAULT 0, expired INTEGER NOT NULL DEFAULT 0, '
+                                    'hash TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (namespace, id))')
+        try:
+            with self.connection:
+                self.connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS coupons_fts USING fts5(brand, description, '
+                                        'category, content=\'coupons\', content_rowid=\'rowid\')')
+                # Keep the external content index in sync with the coupons table
+                self.connection.execute('CREATE TRIGGER IF NOT EXISTS coupons_ai AFTER INSERT ON coupons BEGIN '
+                                        'INSERT INTO coupons_fts (rowid, brand, description, category) '
+                                        'VALUES (new.rowid, new.brand, new.description, new.category); END')
+                self.connection.execute('CREATE TRIGGER IF NOT EXISTS coupons_ad AFTER DELETE ON coupons BEGIN '
+                                        'INSERT INTO coupons_fts (coupons_fts, rowid, brand, description, category) '
+                                        'VALUES (\'delete\', old.rowid, old.brand, old.description, old.category); END')
+                self.connection.execute('CREATE TRIGGER IF NOT EXISTS coupons_au AFTER UPDATE OF brand, description, '
+                                        'category ON coupons BEGIN '
+                                        'INSERT INTO coupons_fts (coupons_fts, rowid, brand, description, category) '
+                                        'VALUES (\'delete\', old.rowid, old.brand, old.description, old.category); '
+                                        'INSERT INTO coupons_fts (rowid, brand, description, category) '
+                                        'VALUES (new.rowid, new.brand, new.description, new.category); END')
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5, searching falls back to LIKE
+            self.has_fts = False
+
+    def refresh(self, coupons):
+        """Upsert the coupons of a fresh listing. Returns the number of added, updated, expired, unchanged and purged
+        coupons (a coupon only clipped or unclipped since the last refresh counts as unchanged).
+        """
+        coupons = get_unique(coupons)
+        now = time.time()
+        stats = {'added': 0, 'updated': 0, 'expired': 0, 'unchanged': 0, 'purged': 0}
+        existing = dict((row[0], (row[1], row[2], row[3])) for row in self.connection.execute(
+            'SELECT id, hash, expired, clipped FROM coupons WHERE namespace = ?', (self.namespace,)))
+
+        with self.connection:
+            for coupon in coupons:
+                values = [coupon.get(field) for field in fields]
+                digest = get_content_hash(coupon)
+                if coupon['id'] not in existing:
+                    self.connection.execute('INSERT INTO coupons (namespace, id, brand, description, value, '
+                                            'expiration_date, category, clipped, hash, updated) '
+                                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                            [self.namespace, coupon['id']] + values + [digest, now])
+                    existing[coupon['id']] = (digest, 0, int(bool(coupon.get('clipped'))))
+                    stats['added'] += 1
+                elif existing[coupon['id']][:2] != (digest, 0):
+                    self.connection.execute('UPDATE coupons SET brand = ?, description = ?, value = ?, '
+                                            'expiration_date = ?, category = ?, clipped = ?, hash = ?, updated = ?, '
+                                            'expired = 0 WHERE namespace = ? AND id = ?',
+                                            values + [digest, now, self.namespace, coupon['id']])
+                    stats['updated'] += 1
+                else:
+                    if existing[coupon['id']][2] != int(bool(coupon.get('clipped'))):
+                        self.connection.execute('UPDATE coupons SET clipped = ? WHERE namespace = ? AND id = ?',
+                                                (bool(coupon.get('clipped')), self.namespace, coupon['id']))
+                    stats['unchanged'] += 1
+
+            listed = set(coupon['id'] for coupon in coupons)
+            stale = [(now, self.namespace, coupon_id) for coupon_id, (_, expired, _) in existing.items()
+                     if coupon_id not in listed and not expired]
+            self.connection.executemany('UPDATE coupons SET expired = 1, updated = ? WHERE namespace = ? AND id = ?',
+                                        stale)
+            stats['expired'] = len(stale)
+            stats['purged'] = self.connection.execute('DELETE FROM coupons WHERE namespace = ? AND expired = 1 '
+                                                      'AND updated < ?',
+                                                      (self.namespace, now - self.expired_retention)).rowcount
+
+        return stats
+
+    def set_clipped(self, coupon_ids):
+        # `clipped` isn't part of the content hash, the next refresh sees these coupons as unchanged
+        with self.connection:
+            self.connection.executemany('UPDATE coupons SET clipped = 1 WHERE namespace = ? AND id = ?',
+                                        [(self.namespace, coupon_id) for coupon_id in coupon_ids])
+
+    def search(self, query, limit=20, include_expired=False):
+        """Full-text search over brand, description and category (prefix matching on every word)."""
+        expired = '' if include_expired else ' AND c.expired = 0'
+        words = query.split()
+        if not words:
+            return self.connection.execute('SELECT c.* FROM coupons c WHERE c.namespace = ?' + expired +
+                                           ' ORDER BY c.value DESC LIMIT ?', (self.namespace, limit)).fetchall()
+
+        if self.has_fts:
+            match = ' '.join('"' + word.replace('"', '""') + '"*' for word in words)
+            return self.connection.execute('SELECT c.* FROM coupons_fts JOIN coupons c ON c.rowid = coupons_fts.rowid '
+                                           'WHERE coupons_fts MATCH ? AND c.namespace = ?' + expired +
+                                           ' ORDER BY coupons_fts.rank LIMIT ?',
+                                           (match, self.namespace, limit)).fetchall()
+
+        conditions = ' AND '.join(['(c.brand || \' \' || c.description || \' \' || c.category) LIKE ?'] * len(words))
+        return self.connection.execute('SELECT c.* FROM coupons c WHERE c.namespace = ? AND ' + conditions + expired +
+                                       ' ORDER BY c.value DESC LIMIT ?',
+                                       [self.namespace] + ['%' + word + '%' for word in words] + [limit]).fetchall()
+
+    def count(self):
+        return self.connection.execute('SELECT COUNT(*) FROM coupons WHERE namespace = ? AND expired = 0',
+                                       (self.namespace,)).fetchone()[0]
+
+    def get_fingerprint(self):
+        """Digest of the available coupons' IDs, changes when a coupon is added or gone (not when one is clipped)."""
+        digest = hashlib.sha1()
+        for row in self.connection.execute('SELECT id FROM coupons WHERE namespace = ? AND expired = 0 ORDER BY id',
+                                           (self.namespace,)):
+            digest.update(row[0].encode() + b'\n')
+        return digest.hexdigest()
+
+    def close(self):
+        self.connection.close()
@@ -1,4 +1,5 @@
 import configparser
+import datetime
 import os
 import click
 import time
@@ -8,15 +9,17 @@ from rich.table import Table
 from rich import box
 from kroger_cli.api import KrogerAPI
 from kroger_cli import helper
+from kroger_cli import tracing
+from kroger_cli import watch
 
 
 class KrogerCLI:
-    def __init__(self, config_file='config.ini'):
+    def __init__(self, config_file='config.ini', console=None):
         self.config_file = config_file
         self.config = configparser.ConfigParser()
         self.username = None
         self.password = None
-        self.console = Console()
+        self.console = console if console is not None else Console()
         self.api = KrogerAPI(self)
         if not os.path.exists(self.config_file):
             self._init_config_file()
@@ -71,6 +74,7 @@ class KrogerCLI:
             self.console.print('[bold]3[/bold] - Purchases Summary')
             self.console.print('[bold]4[/bold] - Points Balance')
             self.console.print('[bold]5[/bold] - Complete Kroger’s Survey (to earn 50 points)')
+            self.console.print('[bold]6[/bold] - Dashboard (account info, points and purchases at once)')
             self.console.print('[bold]8[/bold] - Re-Enter username/password')
             self.console.print('[bold]9[/bold] - Exit')
             option = click.prompt('Please select from one of the options', type=int)
@@ -86,6 +90,8 @@ class KrogerCLI:
                 self.option_points_balance()
             elif option == 5:
                 self.option_survey()
+            elif option == 6:
+                self.option_dashboard()
             elif option == 8:
                 self.prompt_credentials()
             elif option == 9:
@@ -134,9 +140,18 @@ class KrogerCLI:
                 self.config['profile'][field] = str(inp)
                 self._write_config_file()
 
-    def option_survey(self):
+    def option_survey(self, all_eligible=False):
         self._get_details_for_survey()
 
+        if all_eligible:
+            result = self.api.complete_all_surveys()
+            if result is None:
+                self.console.print('[bold red]Couldn\'t load the purchases :([/bold red]')
+            else:
+                self.console.print(f'[bold]{result["completed"]} feedback form(s) completed, {result["skipped"]} '
+                                   f'skipped (already completed or too old), {result["failed"]} failed.[/bold]')
+            return
+
         result = self.api.complete_survey()
         if result == True:
             self.console.print('[bold]The feedback form has been completed successfully![/bold]')
@@ -144,7 +159,187 @@ class KrogerCLI:
             self.console.print('[bold red]Couldn\'t complete the feedback form :([/bold red]')
 
     def option_account_info(self):
-        info = self.api.get_account_info()
+        self._print_account_info(self.api.get_account_info())
+
+    def option_points_balance(self):
+        self._print_points_balance(self.api.get_points_balance())
+
+    def option_clip_coupons(self):
+        # Printed here, the command might have run on the daemon
+        result = self.api.clip_coupons()
+        if result is None:
+            self.console.print('[bold red]Couldn\'t clip the coupons.[/bold red]')
+        elif result['on_page']:
+            self.console.print('[bold]Coupons successfully clipped to your account! :thumbs_up:[/bold]')
+        else:
+            self.console.print(f'[bold]{result["clipped"]} coupon(s) clipped to your account, '
+                               f'{result["skipped"]} already clipped, {result["failed"]} failed '
+                               f'({result["elapsed"]:.1f}s) :thumbs_up:[/bold]')
+
+    def option_coupons_refresh(self):
+        stats = self.api.refresh_coupons_catalog()
+        if stats is None:
+            self.console.print('[bold red]Couldn\'t retrieve the coupons.[/bold red]')
+        else:
+            self.console.print(f'Coupons index updated: {stats["added"]} new, {stats["updated"]} changed, '
+                               f'{stats["expired"]} expired, {stats["unchanged"]} unchanged.')
+
+    def option_coupons_search(self, query, limit=20, include_expired=False):
+        catalog = self.api.get_coupons_catalog()
+        try:
+            if catalog.count() == 0 and not include_expired:
+                self.console.print('[bold red]The coupons index is empty, please run `kroger-cli coupons refresh` '
+                                   'first.[/bold red]')
+                return
+            coupons = catalog.search(query, limit, include_expired)
+        finally:
+            catalog.close()
+
+        table = Table(title='Coupons matching `' + query + '`')
+        table.add_column('Brand')
+        table.add_column('Description')
+        table.add_column('Value')
+        table.add_column('Expires')
+        table.add_column('Category')
+        table.add_column('Clipped')
+        for coupon in coupons:
+            table.add_row(coupon['brand'], coupon['description'], f'${coupon["value"]:.2f}',
+                          coupon['expiration_date'][:10], coupon['category'], 'Yes' if coupon['clipped'] else 'No')
+
+        self.console.print(table)
+
+    def option_watch_add(self, terms):
+        watchlist = self.api.get_watchlist()
+        try:
+            watchlist.add_terms(terms)
+            self.console.print('Watching: ' + ', '.join(watchlist.get_terms()))
+        finally:
+            watchlist.close()
+
+    def option_watch_remove(self, terms):
+        watchlist = self.api.get_watchlist()
+        try:
+            removed = watchlist.remove_terms(terms)
+        finally:
+            watchlist.close()
+        self.console.print(str(removed) + ' term(s) removed from the watchlist.')
+
+    def option_watch_list(self):
+        watchlist = self.api.get_watchlist()
+        try:
+            terms = watchlist.get_terms()
+        finally:
+            watchlist.close()
+        if not terms:
+            self.console.print('The watchlist is empty, add terms with `kroger-cli watch add TERM`.')
+        for term in terms:
+            self.console.print(term)
+
+    def option_watch_run(self, output=None, webhook=None):
+        alerts = self.api.check_watchlist()
+        if alerts is None:
+            self.console.print('[bold red]Couldn\'t retrieve the coupons.[/bold red]')
+            return
+        if not alerts:
+            self.console.print('No new offers matching the watchlist.')
+            return
+
+        table = Table(title=str(len(alerts)) + ' new offer(s) matching the watchlist')
+        table.add_column('Watching')
+        table.add_column('Brand')
+        table.add_column('Description')
+        table.add_column('Value')
+        table.add_column('Expires')
+        for alert in alerts:
+            table.add_row(alert['term'], alert['brand'], alert['description'], f'${alert["value"] or 0:.2f}',
+                          (alert['expiration_date'] or '')[:10])
+        self.console.print(table)
+
+        try:
+            watch.send_alerts(alerts, output, webhook)
+        except OSError as e:
+            self.console.print('[bold red]Couldn\'t deliver the alerts: ' + str(e) + '[/bold red]')
+
+    def option_schedule(self, jobs_file=None, once=False):
+        from kroger_cli import schedule
+        try:
+            jobs = schedule.load_jobs(jobs_file)
+        except ValueError as e:
+            self.console.print('[bold red]' + str(e) + '[/bold red]')
+            return
+
+        if any(job.name == 'survey' for job in jobs):
+            # Asked now, the jobs run unattended
+            self._get_details_for_survey()
+        # Jobs run on this process' own browser, even when a daemon is running
+        self.api.use_daemon = False
+        self.console.print('[bold]Scheduled: ' + ', '.join(job.name for job in jobs) + '[/bold]')
+        schedule.Scheduler(self, jobs).run(once)
+
+    def option_purchases_summary(self, refresh=False, by='year'):
+        if self.api.sync_receipts(refresh) is None:
+            self.console.print('[italic]Couldn\'t sync the receipts, using the stored ones.[/italic]')
+        self._print_purchases_summary(by)
+
+    def option_export_purchases(self, output, file_format, date_from=None, date_to=None, since_last_export=False,
+                                sync=False):
+        from kroger_cli import export
+
+        if sync and self.api.sync_receipts() is None:
+            self.console.print('[italic]Couldn\'t sync the receipts, exporting the stored ones.[/italic]')
+
+        until = None
+        if date_to is not None:
+            until = (date_to + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+        since = date_from.strftime('%Y-%m-%d') if date_from is not None else None
+
+        # Incremental exports are tracked per output file, and append to it
+        marker = os.path.abspath(output)
+        store = self.api.get_receipt_store()
+        try:
+            after = None
+            if since_last_export and os.path.exists(output):
+                after = store.get_last_exported(marker)
+            count, latest = export.export_receipts(store.iter_receipts(since, until, after), output, file_format,
+                                                   append=since_last_export)
+            if latest is not None:
+                store.set_last_exported(marker, max(latest, after or ''))
+        except (ValueError, RuntimeError) as e:
+            self.console.print('[bold red]' + str(e) + '[/bold red]')
+            return
+        finally:
+            store.close()
+
+        self.console.print('[bold]' + str(count) + ' receipt(s) exported to ' + output + '[/bold]')
+
+    def option_dashboard(self):
+        dashboard = self.api.get_dashboard()
+        if dashboard is None:
+            self.console.print('[bold red]Couldn\'t retrieve the dashboard.[/bold red]')
+            return
+
+        self.console.rule('Account Info')
+        self._print_account_info(dashboard['account_info'])
+        self.console.rule('Points Balance')
+        self._print_points_balance(dashboard['points_balance'])
+        self.console.rule('Purchases')
+        if dashboard['receipts_synced'] is None:
+            self.console.print('[italic]Couldn\'t sync the receipts, using the stored ones.[/italic]')
+        self._print_purchases_summary()
+
+    def write_profile(self, path):
+        tracing.write(path)
+        table = Table(title='Slowest phases (trace written to ' + path + ')')
+        table.add_column('Phase')
+        table.add_column('Calls', justify='right')
+        table.add_column('Total', justify='right')
+        table.add_column('Slowest', justify='right')
+        for phase in tracing.get_summary():
+            table.add_row(phase['name'], str(phase['calls']), f'{phase["total"]:.2f}s', f'{phase["max"]:.2f}s')
+
+        self.console.print(table)
+
+    def _print_account_info(self, info):
         if info is None:
             self.console.print('[bold red]Couldn\'t retrieve the account info.[/bold red]')
         else:
@@ -152,8 +347,7 @@ class KrogerCLI:
             self._write_config_file()
             self.console.print(self.config.items(section='profile'))
 
-    def option_points_balance(self):
-        balance = self.api.get_points_balance()
+    def _print_points_balance(self, balance):
         if balance is None:
             self.console.print('[bold red]Couldn\'t retrieve the points balance.[/bold red]')
         elif len(balance) == 1:
@@ -166,25 +360,38 @@ class KrogerCLI:
                 self.console.print(item['programDisplayInfo']['loyaltyProgramName'] + ': '
                                    '[bold]' + item['programBalance']['balanceDescription'] + '[/bold]')
 
-    def option_clip_coupons(self):
-        self.api.clip_coupons()
+    def _print_purchases_summary(self, by='year'):
+        from kroger_cli.analytics import ReceiptColumns
+        store = self.api.get_receipt_store()
+        try:
+            # Columns cached in the store, only rebuilt (receipts streamed, never all loaded at once) after a sync
+            data = helper.process_purchases_summary(ReceiptColumns.from_store(store), by)
+        finally:
+            store.close()
 
-    def option_purchases_summary(self):
-        purchases = self.api.get_purchases_summary()
-        if purchases is None:
+        if data is None:
             self.console.print('[bold red]Couldn\'t retrieve the purchases.[/bold red]')
         else:
-            data = helper.process_purchases_summary(purchases)
-            if data is not None:
-                total = data['total']
-                table = Table(title='Purchases Summary (' + data['first_purchase']['transactionTime'][:10] + ' to ' + data['last_purchase']['transactionTime'][:10] + ')')
-                table.add_column('Year')
-                table.add_column('Store Visits')
-                table.add_column('Dollars Spent')
-                table.add_column('Dollars Saved')
-
-                for key, year in data['years'].items():
-                    table.add_row(str(key), str(year['store_visits']), str(f'${year["total"]:.2f}'), str(f'${year["total_savings"]:.2f}'))
-                table.add_row('Total', str(total['store_visits']), str(f'${total["total"]:.2f}'), str(f'${total["total_savings"]:.2f}'))
-
-                self.console.print(table)
+            total = data['total']
+            table = Table(title='Purchases Summary (' + data['first_date'] + ' to ' + data['last_date'] + ')')
+            table.add_column(by.capitalize())
+            table.add_column('Store Visits')
+            table.add_column('Dollars Spent')
+            table.add_column('Dollars Saved')
+            rolling = by in ('year', 'month', 'week')
+            if rolling:
+                table.add_column('Spent (3 ' + by + 's avg)')
+
+            for key, group in data['groups'].items():
+                row = [str(key), str(group['store_visits']), str(f'${group["total"]:.2f}'),
+                       str(f'${group["total_savings"]:.2f}')]
+                if rolling:
+                    row.append(str(f'${group["rolling_average"]:.2f}'))
+                table.add_row(*row)
+            row = ['Total', str(total['store_visits']), str(f'${total["total"]:.2f}'),
+                   str(f'${total["total_savings"]:.2f}')]
+            if rolling:
+                row.append('')
+            table.add_row(*row)
+
+            self.console.print(table)
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import socket
+
+# Unix domain socket the daemon listens on (relative to the working directory, like the browser profile)
+socket_path = '.kroger-cli.sock'
+
+# `KrogerAPI` coroutines (without the leading underscore) the daemon is allowed to run
+commands = ['get_account_info', 'get_points_balance', 'sync_receipts', 'get_dashboard', 'clip_coupons',
+            'complete_survey', 'complete_all_surveys', 'refresh_coupons_catalog', 'check_watchlist']
+
+
+class DaemonError(Exception):
+    pass
+
+
+def is_supported():
+    return hasattr(socket, 'AF_UNIX')
+
+
+def is_running(path=socket_path):
+    return is_supported() and os.path.exists(path)
+
+
+def request(command, config_file, path=socket_path):
+    """Send a command to the running daemon and return its result. Raises DaemonError when it can't be served."""
+    payload = json.dumps({'command': command, 'config_file': os.path.abspath(config_file)}) + '\n'
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(payload.encode())
+            data = b''
+            while not data.endswith(b'\n'):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+    except OSError as e:
+        raise DaemonError('Daemon is not reachable: ' + str(e))
+
+    try:
+        response = json.loads(data)
+    except ValueError:
+        raise DaemonError('Invalid response from the daemon')
+
+    if not response['ok']:
+        raise DaemonError(response['error'])
+    return response['result']
+
+
+def stop(path=socket_path):
+    payload = json.dumps({'command': 'stop'}) + '\n'
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(payload.encode())
+        sock.recv(65536)
+
+
+class KrogerDaemon:
+    """Keeps one signed-in browser alive and serves `KrogerAPI` commands over a Unix domain socket."""
+
+    def __init__(self, cli, path=socket_path):
+        self.cli = cli
+        self.path = path
+        self._lock = asyncio.Lock()
+        self._server = None
+
+    def serve(self):
+        try:
+            asyncio.get_event_loop().run_until_complete(self._serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.cli.api.close()
+
+    async def _serve(self):
+        if os.path.exists(self.path):
+            # Left over by a daemon that didn't shut down cleanly
+            os.remove(self.path)
+
+        # Warm up: start the browser and sign in before accepting commands
+        if await self.cli.api.ensure_signed_in():
+            # Tabs already on the domain for the commands needing their own page
+            await self.cli.api.get_tab_pool().fill()
+
+        # Owner only: whoever can connect drives the signed-in account
+        umask = os.umask(0o077)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        finally:
+            os.umask(umask)
+        self.cli.console.print('[bold]Daemon is listening on ' + os.path.abspath(self.path) + '[/bold]')
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    async def _handle(self, reader, writer):
+        request = {}
+        try:
+            request = json.loads(await reader.readline())
+            response = await self._dispatch(request)
+        except Exception as e:
+            response = {'ok': False, 'error': str(e) or e.__class__.__name__}
+
+        writer.write((json.dumps(response) + '\n').encode())
+        await writer.drain()
+        writer.close()
+
+        if request.get('command') == 'stop':
+            self._server.close()
+
+    async def _dispatch(self, request):
+        command = request.get('command')
+        if command == 'stop':
+            return {'ok': True, 'result': None}
+        if command not in commands:
+            return {'ok': False, 'error': 'Unknown command: ' + str(command)}
+        if request.get('config_file') != os.path.abspath(self.cli.config_file):
+            return {'ok': False, 'error': 'The daemon serves a different config file'}
+
+        # One browser, so commands are served one at a time
+        async with self._lock:
+            # Pick up the profile details the client might have just written (e.g. for the survey)
+            self.cli.config.read(self.cli.config_file)
+            result = await self.cli.api.execute(command)
+            if result is None and not await self.cli.api.is_authenticated():
+                # The session expired since the warm up: sign in again, and give the command another try
+                self.cli.api.invalidate_session()
+                result = await self.cli.api.execute(command)
+
+        return {'ok': True, 'result': result}
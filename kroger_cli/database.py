@@ -0,0 +1,18 @@
+import os
+import sqlite3
+
+# Local data (clipped coupons ledger, coupons catalog, receipts..) lives in a single SQLite file
+data_file = '.kroger-data.sqlite'
+
+
+def connect(path=None):
+    """Open the local database. WAL mode lets several processes (batch, cron, daemon) share the file."""
+    path = path or data_file
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    return connection
@@ -0,0 +1,103 @@
+import csv
+import json
+import os
+from kroger_cli.purchases import get_receipt_id, get_store_id
+
+formats = ['csv', 'xlsx', 'jsonl']
+columns = ['Date', 'Time', 'Store', 'Total', 'Savings', 'Receipt ID']
+
+
+def get_row(receipt):
+    transaction_time = receipt.get('transactionTime') or ''
+    return [transaction_time[:10], transaction_time[11:19], get_store_id(receipt), receipt.get('total'),
+            receipt.get('totalSavings'), get_receipt_id(receipt)]
+
+
+def export_receipts(receipts, path, file_format, append=False):
+    """Write the receipts one row at a time (constant memory, whatever the number of receipts), after the rows
+    already in the file with `append` (csv and jsonl only). Returns the number of rows and the latest
+    `transactionTime` written.
+    """
+    if file_format == 'csv':
+        writer = CSVWriter(path, append)
+    elif file_format == 'jsonl':
+        writer = JSONLinesWriter(path, append)
+    elif file_format == 'xlsx':
+        if append:
+            raise ValueError('Rows can\'t be appended to an xlsx export, use the csv or jsonl format.')
+        writer = XLSXWriter(path)
+    else:
+        raise ValueError('Unknown export format: ' + file_format)
+
+    count = 0
+    latest = None
+    try:
+        for receipt in receipts:
+            writer.write(receipt)
+            count += 1
+            latest = max(latest or '', receipt.get('transactionTime') or '')
+    finally:
+        writer.close()
+
+    return count, latest
+
+
+def is_empty(path):
+    return not os.path.exists(path) or os.path.getsize(path) == 0
+
+
+class CSVWriter:
+    def __init__(self, path, append=False):
+        # The header is only written at the top of a new (or empty) file
+        header = not append or is_empty(path)
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if header:
+            self.writer.writerow(columns)
+
+    def write(self, receipt):
+        self.writer.writerow(get_row(receipt))
+
+    def close(self):
+        self.file.close()
+
+
+class JSONLinesWriter:
+    """Full receipts (as returned by the site), one JSON document per line."""
+
+    def __init__(self, path, append=False):
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, receipt):
+        self.file.write(json.dumps(receipt) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class XLSXWriter:
+    """Uses XlsxWriter's `constant_memory` mode: each row is flushed to disk once the next one is started."""
+
+    def __init__(self, path):
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise RuntimeError('The xlsx format requires the `XlsxWriter` package (pip install XlsxWriter).')
+
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self.worksheet = self.workbook.add_worksheet('Purchases')
+        self.money = self.workbook.add_format({'num_format': '$#,##0.00'})
+        self.worksheet.write_row(0, 0, columns, self.workbook.add_format({'bold': True}))
+        self.row = 1
+
+    def write(self, receipt):
+        row = get_row(receipt)
+        self.worksheet.write_row(self.row, 0, row[:3])
+        for column in (3, 4):
+            if row[column] is not None:
+                self.worksheet.write_number(self.row, column, row[column], self.money)
+        self.worksheet.write_string(self.row, 5, row[5])
+        self.row += 1
+
+    def close(self):
+        self.workbook.close()
@@ -0,0 +1,50 @@
+import json
+
+# Fields of the scraped pages. Each field is read from the element matching `selector` (the whole body when
+# omitted), from its `attribute` (its text when omitted), then narrowed down to the first group of `regex`
+# (a JavaScript regular expression) when given. A missing element or a regex not matching gives None.
+profile_fields = {
+    'emailAddress': {'selector': '[data-qa="Current Email: -value"]'},
+    'loyaltyCardNumber': {'selector': '[data-qa="Current Value Card Number: -value"]'},
+    'alternateId': {'selector': '[data-qa="Current Alt ID: -value"]'},
+}
+
+receipt_fields = {
+    'entry_id': {'regex': r'Entry ID:\s*(\S+)'},
+    'date': {'regex': r'Date:\s*(\S+)'},
+    'time': {'regex': r'Time:\s*(\S+)'},
+}
+
+
+def get_extract_js(fields):
+    return f"""
+        (() => {{
+            const fields = {json.dumps(fields)};
+            const result = {{}};
+            for (const [name, field] of Object.entries(fields)) {{
+                const element = field.selector ? document.querySelector(field.selector) : document.body;
+                let value = null;
+                if (element) {{
+                    value = field.attribute ? element.getAttribute(field.attribute)
+                                            : (element.innerText || element.textContent || '').trim();
+                }}
+                if (value !== null && field.regex) {{
+                    const match = new RegExp(field.regex).exec(value);
+                    value = match ? (match.length > 1 ? match[1] : match[0]) : null;
+                }}
+                result[name] = value;
+            }}
+            return result;
+        }})()
+    """
+
+
+async def extract(page, fields):
+    """Read all the fields (see `profile_fields`) of the page in a single evaluation, without waiting for any of them.
+    Returns a dict with a value (or None) per field.
+    """
+    result = await page.evaluate(get_extract_js(fields))
+    if not isinstance(result, dict):
+        # Evaluation error (e.g. the page navigated away meanwhile)
+        raise RuntimeError('Couldn\'t extract the fields from the page')
+    return result
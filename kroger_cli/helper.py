@@ -1,3 +1,5 @@
+import json
+
 stores = {
     1: {
         'label': 'Kroger',
@@ -72,46 +74,121 @@ survey_states_mapping = {'AL': 1, 'AK': 2, 'AZ': 3, 'AR': 4, 'CA': 5, 'CO': 6, '
                          'VT': 47, 'VA': 48, 'WA': 49, 'WV': 50, 'WI': 51, 'WY': 52}
 
 
-def process_purchases_summary(purchases):
-    default_dict = {
-        'total': 0.00,
-        'total_savings': 0.00,
-        'store_visits': 0,
+def process_purchases_summary(purchases, by='year'):
+    """Store visits, dollars spent and saved per year (or month, week, weekday, store), see `analytics`.
+    `purchases` is an iterable of receipts, or their `ReceiptColumns`.
+    """
+    from kroger_cli.analytics import ReceiptColumns, periods
+
+    columns = purchases if isinstance(purchases, ReceiptColumns) else ReceiptColumns.from_receipts(purchases)
+    if len(columns) == 0:
+        return None
+
+    groups = columns.group_by(by)
+    if by in periods:
+        # Over consecutive periods: the ones without purchases count as 0
+        rolling_average = ReceiptColumns.rolling_average(groups['total'],
+                                                         positions=ReceiptColumns.get_positions(by, groups['keys']))
+    else:
+        rolling_average = None
+
+    rows = {}
+    for i, label in enumerate(groups['labels']):
+        rows[label] = {
+            'total': float(groups['total'][i]),
+            'total_savings': float(groups['total_savings'][i]),
+            'store_visits': int(groups['store_visits'][i]),
+        }
+        if rolling_average is not None:
+            rows[label]['rolling_average'] = float(rolling_average[i])
+
+    return {
+        'by': by,
+        'groups': rows,
+        'total': {
+            'total': float(groups['total'].sum()),
+            'total_savings': float(groups['total_savings'].sum()),
+            'store_visits': int(groups['store_visits'].sum()),
+        },
+        'first_date': str(columns.times.min())[:10],
+        'last_date': str(columns.times.max())[:10],
     }
-    years = {}
-    total = dict(default_dict)
-    first_purchase = None
-    last_purchase = None
 
-    for purchase in purchases:
-        if first_purchase is None:
-            first_purchase = purchase
 
-        last_purchase = purchase
+def parse_coupons(data):
+    """Flatten the coupons listing payload (`{'data': {'coupons': {id: coupon}}}` or a list) into a list of dicts."""
+    coupons = data
+    for key in ('data', 'coupons'):
+        if isinstance(coupons, dict) and key in coupons:
+            coupons = coupons[key]
+    if isinstance(coupons, dict):
+        coupons = list(coupons.values())
 
-        year = int(purchase['transactionTime'][:4])
-        if year not in years:
-            years[year] = dict(default_dict)
+    result = []
+    for coupon in coupons or []:
+        if not isinstance(coupon, dict):
+            continue
+        coupon_id = coupon.get('id') or coupon.get('couponId') or coupon.get('offerId')
+        if coupon_id is None:
+            continue
 
-        if 'total' in purchase:
-            years[year]['total'] += purchase['total']
-            years[year]['store_visits'] += 1
-            total['total'] += purchase['total']
-            total['store_visits'] += 1
+        categories = coupon.get('categories') or []
+        if isinstance(categories, str):
+            categories = [categories]
+        try:
+            value = float(coupon.get('value') or coupon.get('savings') or 0)
+        except (TypeError, ValueError):
+            value = 0.0
 
-        if 'totalSavings' in purchase:
-            years[year]['total_savings'] += purchase['totalSavings']
-            total['total_savings'] += purchase['totalSavings']
+        result.append({
+            'id': str(coupon_id),
+            'brand': coupon.get('brandName') or '',
+            'description': coupon.get('shortDescription') or coupon.get('description') or '',
+            'value': value,
+            'expiration_date': coupon.get('expirationDate') or '',
+            'category': ', '.join(c if isinstance(c, str) else str(c.get('name', '')) for c in categories),
+            'clipped': bool(coupon.get('addedToCard') or coupon.get('clipped')),
+        })
 
-    if last_purchase is None:
-        return None
+    return result
 
-    return {
-        'years': years,
-        'total': total,
-        'first_purchase': first_purchase,
-        'last_purchase': last_purchase,
-    }
+
+def get_clipped_ids(data, coupon_ids):
+    """IDs (among `coupon_ids`) a clip response confirms as added to the card: from per coupon results (`couponId`
+    with `addedToCard`, `success`, `clipped` or `status`), or from a count of clipped coupons matching the request.
+    Empty when the response reports errors or doesn't tell.
+    """
+    requested = set(str(coupon_id) for coupon_id in coupon_ids)
+    if isinstance(data, dict) and data.get('errors'):
+        return set()
+
+    payload = data.get('data', data) if isinstance(data, dict) else data
+    items = payload if isinstance(payload, list) else None
+    if isinstance(payload, dict):
+        for key in ('clipResponses', 'results', 'coupons'):
+            if isinstance(payload.get(key), (list, dict)):
+                items = payload[key]
+                break
+    if isinstance(items, dict):
+        items = list(items.values())
+
+    if items is not None:
+        confirmed = set()
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            coupon_id = str(item.get('couponId') or item.get('id') or '')
+            ok = item.get('addedToCard', item.get('success', item.get('clipped')))
+            if ok is None and 'status' in item:
+                ok = str(item['status']).lower() in ('success', 'ok', 'clipped', '200')
+            if coupon_id in requested and ok:
+                confirmed.add(coupon_id)
+        return confirmed
+
+    count = payload.get('clipped') if isinstance(payload, dict) else None
+    if isinstance(count, int) and not isinstance(count, bool) and count == len(requested):
+        return requested
+    return set()
 
 
 def map_account_info(config, account_info):
@@ -161,15 +238,16 @@ def get_survey_injection_js(config):
     state_value = survey_states_mapping[config['profile']['state']]
     age = config['profile']['age']
 
+    # The values are JSON literals (quotes and backslashes in the profile are escaped), the variables are local
     js = f"""
         () => {{
-            items = document.getElementsByClassName('simpleInput');
+            const items = document.getElementsByClassName('simpleInput');
             if (items.length == 2) {{
                 items[1].checked = true;
             }}
             if (items.length != 0) {{
                 for (let i=0; i < items.length; i++) {{
-                    item = items[i]
+                    const item = items[i];
                     item.style.display = "";
                     if (item.value == 4 || item.value == 9) {{
                         item.checked = true;
@@ -179,90 +257,148 @@ def get_survey_injection_js(config):
             if (items.length == 11) {{
                 items[2].checked = true;
             }}
-            age = document.getElementById('R002004');
+            const age = document.getElementById('R002004');
             if (age) {{
-                age.value = {age};
+                age.value = {json.dumps(age)};
             }}
-            gender = document.getElementById('R002003');
+            const gender = document.getElementById('R002003');
             if (gender) {{
                 gender.value = 9;
             }}
-            adults1 = document.getElementById('R002017');
+            const adults1 = document.getElementById('R002017');
             if (adults1) {{
                 adults1.value = 9;
             }}
-            adults2 = document.getElementById('R002018');
+            const adults2 = document.getElementById('R002018');
             if (adults2) {{
                 adults2.value = 9;
             }}
-            education = document.getElementById('R002005');
+            const education = document.getElementById('R002005');
             if (education) {{
                 education.value = 99;
             }}
-            income = document.getElementById('R002006');
+            const income = document.getElementById('R002006');
             if (income) {{
                 income.value = 99;
             }}
-            employee = document.getElementById('R003002.2');
+            const employee = document.getElementById('R003002.2');
             if (employee) {{
                 employee.checked = true;
             }}
-            sweepstake = document.getElementById('R003003.1');
+            const sweepstake = document.getElementById('R003003.1');
             if (sweepstake) {{
                 sweepstake.checked = true;
             }}
-            card = document.getElementById('R003005.1');
+            const card = document.getElementById('R003005.1');
             if (card) {{
                 card.checked = true;
             }}
-            card_number = document.getElementById('R003006');
+            const card_number = document.getElementById('R003006');
             if (card_number) {{
-                card_number.value = '{loyalty_card_number}';
+                card_number.value = {json.dumps(loyalty_card_number)};
             }}
 
-            first_name = document.getElementById('S003014');
+            const first_name = document.getElementById('S003014');
             if (first_name) {{
-                first_name.value = '{first_name}';
+                first_name.value = {json.dumps(first_name)};
             }}
-            last_name = document.getElementById('S003015');
+            const last_name = document.getElementById('S003015');
             if (last_name) {{
-                last_name.value = '{last_name}';
+                last_name.value = {json.dumps(last_name)};
             }}
-            address_line1 = document.getElementById('S003016');
+            const address_line1 = document.getElementById('S003016');
             if (address_line1) {{
-                address_line1.value = '{address_line1}';
+                address_line1.value = {json.dumps(address_line1)};
             }}
-            address_line2 = document.getElementById('S003017');
+            const address_line2 = document.getElementById('S003017');
             if (address_line2) {{
-                address_line2.value = '{address_line2}';
+                address_line2.value = {json.dumps(address_line2)};
             }}
-            city = document.getElementById('S003018');
+            const city = document.getElementById('S003018');
             if (city) {{
-                city.value = '{city}';
+                city.value = {json.dumps(city)};
             }}
-            zip = document.getElementById('S003020');
+            const zip = document.getElementById('S003020');
             if (zip) {{
-                zip.value = '{zip}';
+                zip.value = {json.dumps(zip)};
             }}
-            mobile_phone = document.getElementById('S003021');
+            const mobile_phone = document.getElementById('S003021');
             if (mobile_phone) {{
-                mobile_phone.value = '{mobile_phone}';
+                mobile_phone.value = {json.dumps(mobile_phone)};
             }}
-            email_address = document.getElementById('S003022');
+            const email_address = document.getElementById('S003022');
             if (email_address) {{
-                email_address.value = '{email_address}';
+                email_address.value = {json.dumps(email_address)};
             }}
-            email_address2 = document.getElementById('S003023');
+            const email_address2 = document.getElementById('S003023');
             if (email_address2) {{
-                email_address2.value = '{email_address}';
+                email_address2.value = {json.dumps(email_address)};
             }}
-            state = document.getElementById('S003019');
+            const state = document.getElementById('S003019');
             if (state) {{
-                state.value = '{state_value}';
+                state.value = {json.dumps(state_value)};
             }}
-            
+
             return '';
         }}
     """
 
     return js
+
+
+def get_survey_autopilot_js(config, survey_date, url_prefix, binding, timeout):
+    """Script installed on every new document of the survey tab: on the survey's pages it sets the visit date, fills
+    the answers (see `get_survey_injection_js`) and clicks `Next` as soon as the page has loaded and the button shows
+    up, reporting each step through the `binding` (`{event, url}` as JSON): `page` when a page is submitted,
+    `finished` on the finish page, and `stuck` when no `Next` button showed up within `timeout` seconds of the load.
+    """
+    return f"""
+        (() => {{
+            if (!location.href.startsWith({json.dumps(url_prefix)})) {{
+                return;
+            }}
+            const fill = {get_survey_injection_js(config)};
+            const report = (event) => {{
+                window[{json.dumps(binding)}](JSON.stringify({{event: event, url: location.href}}));
+            }};
+            const step = (next) => {{
+                // The visit date has to be set through the date picker, otherwise the validation fails
+                if (document.getElementById('Index_VisitDateDatePicker') && window.jQuery) {{
+                    window.jQuery('#Index_VisitDateDatePicker').datepicker('setDate', {json.dumps(survey_date)});
+                }}
+                fill();
+                report('page');
+                next.click();
+            }};
+            const start = () => {{
+                if (location.href.indexOf('Finish') !== -1) {{
+                    report('finished');
+                    return;
+                }}
+                const find = () => document.getElementById('NextButton');
+                if (find()) {{
+                    step(find());
+                    return;
+                }}
+                // The button might be rendered after the load, it's waited for (up to the time out)
+                const observer = new MutationObserver(() => {{
+                    const next = find();
+                    if (next) {{
+                        observer.disconnect();
+                        clearTimeout(timer);
+                        step(next);
+                    }}
+                }});
+                const timer = setTimeout(() => {{
+                    observer.disconnect();
+                    report('stuck');
+                }}, {json.dumps(int(timeout * 1000))});
+                observer.observe(document.documentElement, {{childList: true, subtree: true}});
+            }};
+            if (document.readyState === 'complete') {{
+                start();
+            }} else {{
+                window.addEventListener('load', start);
+            }}
+        }})();
+    """
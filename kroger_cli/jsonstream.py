@@ -0,0 +1,153 @@
+import json
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+_delimiters = _whitespace + ',:]}'
+
+
+class JSONItemStream:
+    """Incremental JSON decoder: yields the items of an array (or the values of an object) while the text arrives.
+
+    `path` lists the object keys leading to that container, e.g. `('data', 'coupons')`, an empty path means the
+    document itself is the container. Only the item being decoded is buffered, so memory stays flat no matter
+    the size of the document. Raises ValueError when the document doesn't have the expected shape.
+    """
+
+    # Consumed text is dropped from the buffer once it exceeds this size
+    compact_size = 64 * 1024
+
+    def __init__(self, path=()):
+        self.path = list(path)
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.state = 'open'
+        self.key = None
+        self.finished = False
+        self._retry_at = 0
+
+    def feed(self, text):
+        """Add a chunk of the document, returns the items completed by it."""
+        self.buffer += text
+        return list(self._parse())
+
+    def close(self):
+        """Signal the end of the document, returns the last items."""
+        self.finished = True
+        items = list(self._parse())
+        if self.state != 'done':
+            raise ValueError('Incomplete JSON document')
+        return items
+
+    def _parse(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _whitespace:
+                self.pos += 1
+            if self.pos >= len(self.buffer):
+                break
+
+            char = self.buffer[self.pos]
+            if self.state == 'open':
+                if self.depth < len(self.path):
+                    self._expect(char, '{')
+                    self.state = 'key'
+                elif char == '[':
+                    self.pos += 1
+                    self.state = 'array'
+                elif char == '{':
+                    self.pos += 1
+                    self.state = 'object'
+                else:
+                    raise ValueError('Expected an array or an object at ' + self._get_location())
+            elif self.state in ('key', 'object'):
+                # Path object (looking for the next key) or target object (yielding its values)
+                if char == ',':
+                    self.pos += 1
+                    continue
+                if char == '}':
+                    if self.state == 'key':
+                        raise ValueError('Key not found: ' + self._get_location())
+                    self.pos += 1
+                    self.state = 'done'
+                    continue
+                key, complete = self._decode()
+                if not complete:
+                    break
+                self.key = key
+                self.state += '_colon'
+            elif self.state in ('key_colon', 'object_colon'):
+                self._expect(char, ':')
+                if self.state == 'object_colon':
+                    self.state = 'object_value'
+                elif self.key == self.path[self.depth]:
+                    self.depth += 1
+                    self.state = 'open'
+                else:
+                    self.state = 'skip'
+            elif self.state in ('skip', 'object_value'):
+                value, complete = self._decode()
+                if not complete:
+                    break
+                if self.state == 'skip':
+                    self.state = 'key'
+                else:
+                    self.state = 'object'
+                    yield value
+            elif self.state == 'array':
+                if char == ',':
+                    self.pos += 1
+                    continue
+                if char == ']':
+                    self.pos += 1
+                    self.state = 'done'
+                    continue
+                value, complete = self._decode()
+                if not complete:
+                    break
+                yield value
+            else:
+                # Whatever follows the container isn't needed
+                self.pos = len(self.buffer)
+
+        if self.pos >= self.compact_size or self.pos == len(self.buffer):
+            self.buffer = self.buffer[self.pos:]
+            self._retry_at = max(self._retry_at - self.pos, 0)
+            self.pos = 0
+
+    def _decode(self):
+        """Decode the value at the current position. Returns (value, False) while it is still incomplete."""
+        if not self.finished and len(self.buffer) < self._retry_at:
+            return None, False
+        try:
+            value, end = _decoder.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError:
+            if self.finished:
+                raise ValueError('Invalid JSON at ' + self._get_location())
+            # Don't retry until the pending text has (at least) doubled, keeps large items linear
+            self._retry_at = self.pos + 2 * (len(self.buffer) - self.pos)
+            return None, False
+
+        if not self.finished and (end >= len(self.buffer) or self.buffer[end] not in _delimiters):
+            # A number cut by the end of the chunk (`12` of `123`, `3` of `3.5`) continues in the next one
+            self._retry_at = len(self.buffer) + 1
+            return None, False
+
+        self.pos = end
+        self._retry_at = 0
+        return value, True
+
+    def _expect(self, char, expected):
+        if char != expected:
+            raise ValueError('Expected `' + expected + '` at ' + self._get_location())
+        self.pos += 1
+
+    def _get_location(self):
+        return '/' + '/'.join(self.path[:self.depth + 1])
+
+
+def iter_items(chunks, path=()):
+    """Yield the items of the JSON document given as an iterable of text chunks (see `JSONItemStream`)."""
+    stream = JSONItemStream(path)
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    yield from stream.close()
@@ -0,0 +1,39 @@
+import time
+from kroger_cli import database
+
+
+class Ledger:
+    """Persistent set of already processed item IDs (e.g. completed surveys), per account."""
+
+    def __init__(self, kind, namespace, path=None):
+        self.kind = kind
+        self.namespace = namespace
+        self.connection = database.connect(path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS ledger (namespace TEXT NOT NULL, kind TEXT NOT NULL, '
+                                    'item_id TEXT NOT NULL, created REAL NOT NULL, '
+                                    'PRIMARY KEY (namespace, kind, item_id))')
+
+    def __contains__(self, item_id):
+        row = self.connection.execute('SELECT 1 FROM ledger WHERE namespace = ? AND kind = ? AND item_id = ?',
+                                      (self.namespace, self.kind, str(item_id))).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM ledger WHERE namespace = ? AND kind = ?',
+                                       (self.namespace, self.kind)).fetchone()[0]
+
+    def get_ids(self):
+        rows = self.connection.execute('SELECT item_id FROM ledger WHERE namespace = ? AND kind = ?',
+                                       (self.namespace, self.kind))
+        return set(row[0] for row in rows)
+
+    def add(self, item_ids):
+        now = time.time()
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO ledger (namespace, kind, item_id, created) '
+                                        'VALUES (?, ?, ?, ?)',
+                                        [(self.namespace, self.kind, str(item_id), now) for item_id in item_ids])
+
+    def close(self):
+        self.connection.close()
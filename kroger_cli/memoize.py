@@ -1,53 +1,143 @@
 import functools
+import hashlib
+import inspect
+import os
 import pickle
-from datetime import datetime, timedelta
+import sqlite3
+import time
+
+
+class CacheStore:
+    """Persistent key/value store backed by SQLite.
+    Writes are atomic (one transaction each) and several processes can safely share the same file.
+    Entries expire individually, and the least recently used ones are evicted once `max_entries` is reached.
+    """
+
+    def __init__(self, path, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self._connection = None
+
+    def get(self, key, default=None):
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                row = connection.execute('SELECT value, expire FROM cache WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return default
+                if row[1] < now:
+                    connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+                    return default
+                connection.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        except sqlite3.Error:
+            return default
+
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            # Corrupted, or pickled by another version of the code (renamed class or module..): a miss
+            self.delete(key)
+            return default
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        try:
+            with self._connect() as connection:
+                connection.execute('INSERT OR REPLACE INTO cache (key, value, expire, accessed) VALUES (?, ?, ?, ?)',
+                                   (key, data, now + ttl, now))
+                connection.execute('DELETE FROM cache WHERE expire < ?', (now,))
+                connection.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed DESC '
+                                   'LIMIT -1 OFFSET ?)', (self.max_entries,))
+        except sqlite3.Error:
+            # The cache is an optimization only, never fail the command because of it
+            pass
+
+    def delete(self, key):
+        try:
+            with self._connect() as connection:
+                connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        try:
+            with self._connect() as connection:
+                connection.execute('DELETE FROM cache')
+        except sqlite3.Error:
+            pass
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                               'expire REAL NOT NULL, accessed REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+            connection.commit()
+            self._connection = connection
+        return self._connection
 
 
 class memoized(object):
     """Decorator. Caches a function's return value each time it is called.
-    If called later with the same arguments, the cached value is returned, unless returned value is equal to None
+    If called later with the same arguments, the cached value is returned, unless returned value is equal to None.
+
+    Entries are keyed by the function, its arguments and the instance's cache namespace (see
+    `KrogerAPI.get_cache_namespace`), and expire after `ttl` seconds. Use either `@memoized` or `@memoized(ttl=60)`.
     """
 
-    cache_file = '.cache.pkl'
+    cache_file = '.cache.sqlite'
     cache_expiration_hours = 1
-    default_cache = {
-        'expire': datetime.now() + timedelta(hours=cache_expiration_hours),
-        'data': {}
-    }
+    max_entries = 1000
+    _stores = {}
 
-    def __init__(self, func):
+    def __init__(self, func=None, ttl=None):
         self.func = func
-        self.cache = self.default_cache
-        self._init_file_cache()
-
-    def __call__(self, *args):
-        key = self.func.__name__
-        if key in self.cache['data']:
-            return self.cache['data'][key]
-        else:
-            value = self.func(*args)
+        self.ttl = ttl if ttl is not None else self.cache_expiration_hours * 3600
+        if func is not None:
+            functools.update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        if self.func is None:
+            # Used as `@memoized(ttl=..)`, the first call receives the decorated function
+            self.__init__(args[0], self.ttl)
+            return self
+
+        store = self.get_store()
+        key = self.get_key(args, kwargs)
+        value = store.get(key)
+        if value is None:
+            value = self.func(*args, **kwargs)
             if value is not None:
-                self.cache['data'][key] = value
-                self._save_cache_file()
-            return value
+                store.set(key, value, self.ttl)
+        return value
 
     def __get__(self, obj, objtype):
         """Support instance methods."""
         return functools.partial(self.__call__, obj)
 
-    def _init_file_cache(self):
-        try:
-            with open(self.cache_file, 'rb') as f:
-                cache = pickle.load(f)
-        except Exception:
-            cache = None
+    def get_key(self, args, kwargs):
+        # Arguments bound to the parameters, defaults included: `f(2)`, `f(x=2)` and `f()` (with `x=2`) share a key
+        signature = inspect.signature(self.func)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = [(name, sorted(value.items()) if signature.parameters[name].kind == inspect.Parameter.VAR_KEYWORD
+                      else value) for name, value in bound.arguments.items()]
 
-        if cache is not None:
-            self.cache = cache
+        namespace = ''
+        if args and hasattr(args[0], 'get_cache_namespace'):
+            namespace = args[0].get_cache_namespace()
+            arguments = arguments[1:]
 
-        if 'expire' in self.cache and datetime.now() > self.cache['expire']:
-            self.cache = self.default_cache
+        digest = hashlib.sha1(repr(arguments).encode()).hexdigest()
+        return self.func.__name__ + ':' + namespace + ':' + digest
 
-    def _save_cache_file(self):
-        with open(self.cache_file, 'wb') as f:
-            pickle.dump(self.cache, f, pickle.HIGHEST_PROTOCOL)
+    @classmethod
+    def get_store(cls):
+        if cls.cache_file not in cls._stores:
+            cls._stores[cls.cache_file] = CacheStore(cls.cache_file, cls.max_entries)
+        return cls._stores[cls.cache_file]
@@ -0,0 +1,120 @@
+import json
+from kroger_cli import tracing
+
+# Known popups and overlays of the storefront, clicked away as soon as they show up. `text`, when given, must be
+# the element's whole (trimmed) text or its aria-label.
+overlays = [
+    {'selector': 'button', 'text': 'Dismiss'},
+    {'selector': 'button', 'text': 'Close pop-up'},
+    {'selector': '.ModalitySelectorDynamicTooltip--Overlay'},
+    {'selector': '.kds-Modal .kds-DismissalButton'},
+]
+
+
+def get_dismisser_js(overlays, binding):
+    """In-page watcher: a MutationObserver checking the overlays after every DOM change (at most once a frame),
+    clicking the visible ones and reporting each click through the `binding` function.
+    """
+    return f"""
+        (() => {{
+            if (window.__krogerPopupDismisser) {{
+                return;
+            }}
+            window.__krogerPopupDismisser = true;
+            const overlays = {json.dumps(overlays)};
+            const clicked = new WeakSet();
+            let scheduled = false;
+
+            const dismiss = () => {{
+                scheduled = false;
+                for (const overlay of overlays) {{
+                    for (const element of document.querySelectorAll(overlay.selector)) {{
+                        if (clicked.has(element) || !element.getClientRects().length) {{
+                            continue;
+                        }}
+                        if (overlay.text && (element.textContent || '').trim() !== overlay.text &&
+                                element.getAttribute('aria-label') !== overlay.text) {{
+                            continue;
+                        }}
+                        clicked.add(element);
+                        element.click();
+                        if (typeof window[{json.dumps(binding)}] === 'function') {{
+                            window[{json.dumps(binding)}](JSON.stringify({{selector: overlay.selector,
+                                                                           text: overlay.text || null}}));
+                        }}
+                    }}
+                }}
+            }};
+
+            const schedule = () => {{
+                if (!scheduled) {{
+                    scheduled = true;
+                    requestAnimationFrame(dismiss);
+                }}
+            }};
+
+            const observe = () => {{
+                new MutationObserver(schedule).observe(document.documentElement, {{childList: true, subtree: true}});
+                schedule();
+            }};
+            if (document.documentElement) {{
+                observe();
+            }} else {{
+                document.addEventListener('DOMContentLoaded', observe);
+            }}
+        }})()
+    """
+
+
+class PopupDismisser:
+    """Keeps the known popups (see `overlays`) out of the way on the attached tabs: the in-page watcher runs on every
+    document loaded in the tab, so the flows never wait for a popup that might not show up.
+    """
+
+    binding = '__krogerPopupDismissed'
+
+    def __init__(self, overlays):
+        self.overlays = overlays
+        self.scripts = {}
+        self.dismissed = {}
+
+    async def attach(self, tab):
+        from zendriver import cdp
+        if tab in self.scripts:
+            return
+        js = get_dismisser_js(self.overlays, self.binding)
+        await tab.send(cdp.runtime.add_binding(self.binding))
+        tab.add_handler(cdp.runtime.BindingCalled, self._on_binding_called)
+        self.scripts[tab] = await tab.send(cdp.page.add_script_to_evaluate_on_new_document(js))
+        # The document already loaded
+        try:
+            await tab.evaluate(js)
+        except Exception:
+            pass
+
+    def detach(self, tab):
+        """Forget the tab, only valid right before it's closed (see `TabPool`): the script and the binding are left
+        in place, they go away with the tab. Only the event handler (local) is removed.
+        """
+        from zendriver import cdp
+        if self.scripts.pop(tab, None) is not None:
+            tab.remove_handlers(cdp.runtime.BindingCalled, self._on_binding_called)
+
+    def _on_binding_called(self, event):
+        if event.name != self.binding:
+            return
+        try:
+            overlay = json.loads(event.payload)
+        except ValueError:
+            return
+        label = overlay.get('text') or overlay.get('selector')
+        self.dismissed[label] = self.dismissed.get(label, 0) + 1
+        with tracing.span('popup dismissed', overlay=label):
+            pass
+
+    def get_stats(self):
+        """Number of dismissed popups per overlay (text or selector) since the last reset."""
+        return dict(self.dismissed)
+
+    def reset_stats(self):
+        self.dismissed = {}
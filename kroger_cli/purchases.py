@@ -0,0 +1,150 @@
+import json
+import time
+from kroger_cli import database
+
+
+def get_receipt_id(receipt):
+    """Receipts are identified by their `receiptId` (store, terminal, transaction..), when present."""
+    receipt_id = receipt.get('receiptId')
+    if isinstance(receipt_id, dict):
+        return json.dumps(receipt_id, sort_keys=True)
+    if receipt_id:
+        return str(receipt_id)
+    return str(receipt.get('transactionTime')) + '|' + str(receipt.get('total'))
+
+
+def get_store_id(receipt):
+    receipt_id = receipt.get('receiptId')
+    if isinstance(receipt_id, dict) and 'storeNumber' in receipt_id:
+        return f'{receipt_id.get("divisionNumber", "")}-{receipt_id["storeNumber"]}'
+    return 'Unknown'
+
+
+class ReceiptStore:
+    """Persistent store of an account's receipts (purchases summary), keyed by receipt ID.
+    Tracks the `transactionTime` high-water mark (latest receipt stored). Every fetched receipt is inserted, the ones
+    already stored are ignored by their ID: a receipt posted late, older than the mark, isn't lost.
+    """
+
+    def __init__(self, namespace, path=None):
+        self.namespace = namespace
+        self.connection = database.connect(path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS receipts (namespace TEXT NOT NULL, '
+                                    'receipt_id TEXT NOT NULL, transaction_time TEXT NOT NULL, total REAL, '
+                                    'total_savings REAL, data TEXT NOT NULL, PRIMARY KEY (namespace, receipt_id))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS receipts_time ON receipts (namespace, transaction_time)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS receipts_sync (namespace TEXT PRIMARY KEY, '
+                                    'high_water_mark TEXT, synced REAL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS receipts_exports (namespace TEXT NOT NULL, '
+                                    'name TEXT NOT NULL, last_exported TEXT, PRIMARY KEY (namespace, name))')
+            # Columnar form of the receipts (see `analytics.ReceiptColumns`), valid as long as the version matches
+            self.connection.execute('CREATE TABLE IF NOT EXISTS receipts_columns (namespace TEXT PRIMARY KEY, '
+                                    'version TEXT NOT NULL, data BLOB NOT NULL)')
+
+    def get_high_water_mark(self):
+        row = self.connection.execute('SELECT high_water_mark FROM receipts_sync WHERE namespace = ?',
+                                      (self.namespace,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get_last_synced(self):
+        row = self.connection.execute('SELECT synced FROM receipts_sync WHERE namespace = ?',
+                                      (self.namespace,)).fetchone()
+        return row[0] if row is not None and row[0] is not None else 0.0
+
+    def is_stale(self, interval):
+        return time.time() - self.get_last_synced() > interval
+
+    def add(self, receipts):
+        """Add the receipts not stored yet. Returns the number of receipts added."""
+        sync = self.start_sync()
+        sync.add(receipts)
+        sync.finish()
+        return sync.added
+
+    def start_sync(self):
+        """Start a sync fed in several batches (e.g. while the receipts are being streamed), see `ReceiptSync`."""
+        return ReceiptSync(self, self.get_high_water_mark() or '')
+
+    def iter_receipts(self, since=None, until=None, after=None):
+        """Yield the stored receipts in chronological order, optionally within [since, until) (ISO dates/times),
+        or strictly after `after`.
+        """
+        query = 'SELECT data FROM receipts WHERE namespace = ?'
+        parameters = [self.namespace]
+        if after:
+            query += ' AND transaction_time > ?'
+            parameters.append(after)
+        if since:
+            query += ' AND transaction_time >= ?'
+            parameters.append(since)
+        if until:
+            query += ' AND transaction_time < ?'
+            parameters.append(until)
+
+        for row in self.connection.execute(query + ' ORDER BY transaction_time', parameters):
+            yield json.loads(row[0])
+
+    def get_receipts(self, since=None, until=None):
+        return list(self.iter_receipts(since, until))
+
+    def get_last_exported(self, name):
+        row = self.connection.execute('SELECT last_exported FROM receipts_exports WHERE namespace = ? AND name = ?',
+                                      (self.namespace, name)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_last_exported(self, name, transaction_time):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO receipts_exports (namespace, name, last_exported) '
+                                    'VALUES (?, ?, ?)', (self.namespace, name, transaction_time))
+
+    def get_version(self):
+        """Changes whenever receipts are added (high-water mark and number of receipts)."""
+        return str(self.get_high_water_mark()) + '|' + str(self.count())
+
+    def get_cached_columns(self, version):
+        row = self.connection.execute('SELECT data FROM receipts_columns WHERE namespace = ? AND version = ?',
+                                      (self.namespace, version)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_cached_columns(self, version, data):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO receipts_columns (namespace, version, data) '
+                                    'VALUES (?, ?, ?)', (self.namespace, version, data))
+
+    def count(self):
+        return self.connection.execute('SELECT COUNT(*) FROM receipts WHERE namespace = ?',
+                                       (self.namespace,)).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+class ReceiptSync:
+    """A sync in progress. Batches are written as they come, the high-water mark only moves on `finish`,
+    so an interrupted sync is simply resumed (and de-duplicated) by the next one.
+    """
+
+    def __init__(self, store, high_water_mark):
+        self.store = store
+        self.high_water_mark = high_water_mark
+        self.latest = high_water_mark
+        self.added = 0
+
+    def add(self, receipts):
+        connection = self.store.connection
+        with connection:
+            for receipt in receipts:
+                transaction_time = receipt.get('transactionTime') or ''
+                # Receipts already stored are de-duplicated by their ID, whatever their time
+                cursor = connection.execute('INSERT OR IGNORE INTO receipts (namespace, receipt_id, transaction_time, '
+                                            'total, total_savings, data) VALUES (?, ?, ?, ?, ?, ?)',
+                                            (self.store.namespace, get_receipt_id(receipt), transaction_time,
+                                             receipt.get('total'), receipt.get('totalSavings'), json.dumps(receipt)))
+                self.added += cursor.rowcount
+                self.latest = max(self.latest, transaction_time)
+
+    def finish(self):
+        with self.store.connection:
+            self.store.connection.execute('INSERT OR REPLACE INTO receipts_sync (namespace, high_water_mark, synced) '
+                                          'VALUES (?, ?, ?)', (self.store.namespace, self.latest or None, time.time()))
@@ -0,0 +1,99 @@
+import asyncio
+import json
+from kroger_cli import tracing
+
+# How often the page is polled while waiting on a readiness signal (seconds)
+poll_interval = 0.1
+
+
+async def wait_until(check, timeout, interval=poll_interval):
+    """Poll `check` (a coroutine function) until it returns a truthy value or the timeout runs out.
+    Returns the truthy value, or None on timeout.
+    """
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+
+    while True:
+        try:
+            result = await check()
+        except Exception:
+            # The page might be in the middle of a navigation, try again on the next tick
+            result = None
+
+        if result:
+            return result
+        if loop.time() >= deadline:
+            return None
+        await asyncio.sleep(interval)
+
+
+@tracing.traced()
+async def wait_for_load(page, timeout):
+    """Wait for the document to be at least interactive."""
+    async def check():
+        return await page.evaluate('document.readyState') in ('interactive', 'complete')
+
+    return await wait_until(check, timeout)
+
+
+@tracing.traced()
+async def wait_for_selector(page, selector, timeout):
+    """Wait for an element matching the CSS selector to be present in the DOM."""
+    js = '!!document.querySelector(' + json.dumps(selector) + ')'
+
+    async def check():
+        return await page.evaluate(js)
+
+    return await wait_until(check, timeout)
+
+
+@tracing.traced()
+async def wait_for_text(page, text, timeout):
+    """Wait for the given text to appear in the document body."""
+    js = '!!document.body && document.body.innerText.indexOf(' + json.dumps(text) + ') !== -1'
+
+    async def check():
+        return await page.evaluate(js)
+
+    return await wait_until(check, timeout)
+
+
+@tracing.traced()
+async def wait_for_url_change(page, old_url, timeout):
+    """Wait for the page to navigate away from `old_url`. Returns the new URL (or None on timeout)."""
+    async def check():
+        url = await page.evaluate('location.href')
+        return url if url != old_url else None
+
+    return await wait_until(check, timeout)
+
+
+@tracing.traced()
+async def wait_for_json(page, timeout):
+    """Wait for a raw JSON response to be rendered by Chrome (as a `<pre>` body)."""
+    js = "(() => { const pre = document.querySelector('body > pre'); " \
+         "return document.readyState === 'complete' && !!pre && pre.textContent.length > 0; })()"
+
+    async def check():
+        return await page.evaluate(js)
+
+    return await wait_until(check, timeout)
+
+
+@tracing.traced()
+async def wait_for_network_idle(page, timeout, idle_time=0.5):
+    """Wait until no new resources have been loaded by the page for `idle_time` seconds."""
+    js = "performance.getEntriesByType('resource').length"
+    loop = asyncio.get_event_loop()
+    state = {'count': -1, 'since': loop.time()}
+
+    async def check():
+        count = await page.evaluate(js)
+        now = loop.time()
+        if count != state['count']:
+            state['count'] = count
+            state['since'] = now
+            return False
+        return now - state['since'] >= idle_time
+
+    return await wait_until(check, timeout)
@@ -0,0 +1,151 @@
+import asyncio
+import random
+import time
+from kroger_cli import tracing
+from kroger_cli.transport import FetchError
+
+
+class RetryPolicy:
+    """How a step is retried: up to `attempts` tries, waiting `delay` seconds (doubled after every failure, capped
+    at `max_delay`, +/- `jitter` of it) in between, and no new try once `budget` seconds have been spent.
+    """
+
+    def __init__(self, attempts=3, delay=0.2, max_delay=2.0, budget=10.0, jitter=0.5):
+        self.attempts = attempts
+        self.delay = delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.jitter = jitter
+
+    def get_delay(self, attempt):
+        delay = min(self.delay * 2 ** (attempt - 1), self.max_delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+# Retry policy per step (`default` for the others)
+policies = {
+    'default': RetryPolicy(),
+    'navigate': RetryPolicy(attempts=3, delay=0.25, budget=30.0),
+    'fetch': RetryPolicy(attempts=4, delay=0.2, budget=15.0),
+    'evaluate': RetryPolicy(attempts=3, delay=0.1, budget=5.0),
+    'select': RetryPolicy(attempts=3, delay=0.2, budget=10.0),
+    'sign_in': RetryPolicy(attempts=2, delay=1.0, budget=90.0),
+}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, domain, retry_in):
+        super().__init__('Too many failures on ' + domain + ', not trying again for ' + str(round(retry_in)) + 's')
+        self.domain = domain
+
+
+class CircuitBreaker:
+    """Stops sending requests to a domain after `threshold` consecutive failures, for `cooldown` seconds. A single
+    trial request then goes through: its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+
+    def get_retry_in(self):
+        """Seconds left before the next trial, 0 when requests are allowed."""
+        if self.opened is None:
+            return 0
+        return max(self.opened + self.cooldown - time.monotonic(), 0)
+
+    def allow(self):
+        if self.get_retry_in() > 0:
+            return False
+        if self.opened is not None:
+            # Half open: let this one through, the next ones wait for its outcome
+            self.opened = time.monotonic()
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened = time.monotonic()
+
+
+# Shared by every `Retrier` of the process, so the accounts of a batch run back off from a failing domain together
+breakers = {}
+
+
+def is_transient(error):
+    """Errors worth retrying: time outs, protocol/connection errors, and the HTTP errors a retry might fix. Anything
+    else (a bug, an unexpected answer..) would fail the same way again.
+    """
+    if isinstance(error, FetchError):
+        return error.status >= 500 or error.status in (408, 429)
+    # `ConnectionError` (and `TimeoutError` from Python 3.11) are `OSError`s
+    if isinstance(error, (asyncio.TimeoutError, OSError)):
+        return True
+    try:
+        from zendriver.core.connection import ProtocolException
+    except ImportError:
+        return False
+    return isinstance(error, ProtocolException)
+
+
+class Retrier:
+    """Runs the steps of a command (navigation, element lookup, evaluation, fetch..) under their retry policy, with a
+    circuit breaker per domain.
+    """
+
+    def __init__(self, policies, breakers=None, threshold=5, cooldown=30.0):
+        self.policies = policies
+        self.breakers = breakers if breakers is not None else {}
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def get_policy(self, step):
+        return self.policies.get(step) or self.policies['default']
+
+    def get_breaker(self, domain):
+        if domain not in self.breakers:
+            self.breakers[domain] = CircuitBreaker(self.threshold, self.cooldown)
+        return self.breakers[domain]
+
+    async def call(self, step, func, domain=None):
+        """Await `func()` (a coroutine function taking no argument) until it succeeds, retrying the transient errors.
+        The last error is raised once the tries are exhausted, right away when it isn't transient.
+        """
+        policy = self.get_policy(step)
+        breaker = self.get_breaker(domain) if domain else None
+        deadline = time.monotonic() + policy.budget
+        attempt = 0
+
+        while True:
+            attempt += 1
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(domain, breaker.get_retry_in())
+
+            try:
+                result = await func()
+            except Exception as e:
+                error = e
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+            if breaker is not None:
+                if is_transient(error):
+                    breaker.record_failure()
+                else:
+                    # The domain answered (e.g. HTTP 401), it's not the one failing
+                    breaker.record_success()
+
+            delay = policy.get_delay(attempt)
+            if attempt >= policy.attempts or time.monotonic() + delay > deadline or not is_transient(error):
+                raise error
+
+            with tracing.span('retry', step=step, attempt=attempt, error=type(error).__name__):
+                await asyncio.sleep(delay)
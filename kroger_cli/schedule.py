@@ -0,0 +1,273 @@
+import asyncio
+import configparser
+import datetime
+import random
+import time
+from kroger_cli import database
+from kroger_cli import tracing
+
+_units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value):
+    """Seconds of a duration like `90`, `90s`, `15m`, `6h` or `1d`."""
+    value = str(value).strip().lower()
+    try:
+        if value and value[-1] in _units:
+            return float(value[:-1]) * _units[value[-1]]
+        return float(value)
+    except ValueError:
+        raise ValueError('Invalid duration: ' + value)
+
+
+class CronSchedule:
+    """Standard 5-field cron expression (minute, hour, day of month, month, day of week), with `*`, `*/n`, ranges
+    (`a-b`, `a-b/n`) and lists (`a,b`). Days of week go from 0 (Sunday) to 6, 7 is Sunday too.
+    """
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError('Invalid cron expression (5 fields expected): ' + expression)
+        self.expression = expression
+        self.minutes = self._parse(parts[0], 0, 59)
+        self.hours = self._parse(parts[1], 0, 23)
+        self.days = self._parse(parts[2], 1, 31)
+        self.months = self._parse(parts[3], 1, 12)
+        self.weekdays = set(day % 7 for day in self._parse(parts[4], 0, 7))
+        # Like cron: when both days are restricted, either one matches
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    def _parse(self, field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = None
+            if '/' in part:
+                part, step = part.split('/', 1)
+                step = int(step)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(bound) for bound in part.split('-', 1))
+            else:
+                # `a/n` stands for `a-<last>/n`
+                start = int(part)
+                end = high if step is not None else start
+            step = step if step is not None else 1
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError('Invalid cron field: ' + field)
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _matches_day(self, date):
+        in_days = date.day in self.days
+        in_weekdays = (date.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def get_next(self, after):
+        """First matching minute strictly after the `after` datetime."""
+        moment = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = moment + datetime.timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._matches_day(moment):
+                moment = moment.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + datetime.timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += datetime.timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError('The cron expression never matches: ' + self.expression)
+
+
+class Job:
+    """A command run on a schedule: every `every` seconds or on a `cron` expression, delayed by up to `jitter` seconds
+    (spreads the accounts' requests), and abandoned after `timeout` seconds.
+    """
+
+    def __init__(self, name, every=None, cron=None, jitter=0.0, timeout=None):
+        if name not in jobs:
+            raise ValueError('Unknown job: ' + name + ' (one of ' + ', '.join(jobs) + ')')
+        if (every is None) == (cron is None):
+            raise ValueError('Job ' + name + ' needs either `every` or `cron`')
+        self.name = name
+        self.command = jobs[name]['command']
+        self.get_inputs = jobs[name]['inputs']
+        self.every = every
+        self.cron = CronSchedule(cron) if cron is not None else None
+        self.jitter = jitter
+        self.timeout = timeout
+
+    def get_next_run(self, last_run, now):
+        """Timestamp of the next run. A job that never ran (interval) or missed its time (cron) runs right away."""
+        if self.every is not None:
+            if last_run is None:
+                return now
+            next_run = last_run + self.every
+        else:
+            after = datetime.datetime.fromtimestamp(last_run if last_run is not None else now)
+            next_run = self.cron.get_next(after).timestamp()
+        return max(next_run + random.uniform(0, self.jitter), now)
+
+
+async def get_receipts_inputs(api):
+    """The receipts' version (after a sync): no new receipt, no new survey to complete."""
+    if await api.execute('sync_receipts') is None:
+        return None
+    store = api.get_receipt_store()
+    try:
+        return store.get_version()
+    finally:
+        store.close()
+
+
+async def get_coupons_inputs(api):
+    """The available coupons (after a refresh of the local index): no new coupon, nothing to clip."""
+    if await api.execute('refresh_coupons_catalog') is None:
+        return None
+    catalog = api.get_coupons_catalog()
+    try:
+        return catalog.get_fingerprint()
+    finally:
+        catalog.close()
+
+
+# Jobs the scheduler can run: the `KrogerAPI` command, and what its inputs are (the job is skipped when they didn't
+# change since its last successful run, None to always run it)
+jobs = {
+    'clip-coupons': {'command': 'clip_coupons', 'inputs': get_coupons_inputs},
+    'survey': {'command': 'complete_all_surveys', 'inputs': get_receipts_inputs},
+    'points-balance': {'command': 'get_points_balance', 'inputs': None},
+}
+
+# Used when no jobs file is given
+default_jobs = {
+    'clip-coupons': {'every': '6h', 'jitter': '15m', 'timeout': '15m'},
+    'survey': {'cron': '0 9 * * *', 'jitter': '30m', 'timeout': '30m'},
+    'points-balance': {'cron': '0 8 * * *', 'jitter': '30m', 'timeout': '5m'},
+}
+
+
+def load_jobs(path=None):
+    """Read the jobs from an ini file, one section per job (see `jobs`) with `every` or `cron`, and optional `jitter`
+    and `timeout` (durations like `90s`, `15m`, `6h`):
+
+        [clip-coupons]
+        every = 6h
+        jitter = 15m
+
+        [survey]
+        cron = 0 9 * * *
+        timeout = 30m
+    """
+    spec = configparser.ConfigParser()
+    if path is None:
+        spec.read_dict(default_jobs)
+    elif not spec.read(path):
+        raise ValueError('Couldn\'t read the jobs file: ' + path)
+
+    return [Job(name,
+                every=parse_duration(section['every']) if 'every' in section else None,
+                cron=section.get('cron'),
+                jitter=parse_duration(section.get('jitter', '0')),
+                timeout=parse_duration(section['timeout']) if 'timeout' in section else None)
+            for name, section in spec.items() if name != spec.default_section]
+
+
+class Scheduler:
+    """Runs the jobs of an account one at a time, in this process, on a single browser session: Chrome is launched
+    and signed in once, not once per job. The last run and inputs of every job are kept in the local database, so
+    a restarted scheduler picks up where it left off.
+    """
+
+    def __init__(self, cli, jobs, path=None):
+        self.cli = cli
+        self.jobs = jobs
+        self.namespace = cli.api.get_cache_namespace()
+        self.connection = database.connect(path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS schedule_jobs (namespace TEXT NOT NULL, '
+                                    'job TEXT NOT NULL, last_run REAL, inputs TEXT, '
+                                    'PRIMARY KEY (namespace, job))')
+
+    def get_state(self, job):
+        row = self.connection.execute('SELECT last_run, inputs FROM schedule_jobs WHERE namespace = ? AND job = ?',
+                                      (self.namespace, job.name)).fetchone()
+        return (row[0], row[1]) if row is not None else (None, None)
+
+    def set_state(self, job, last_run, inputs):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO schedule_jobs (namespace, job, last_run, inputs) '
+                                    'VALUES (?, ?, ?, ?)', (self.namespace, job.name, last_run, inputs))
+
+    def run(self, once=False):
+        """Run the jobs when they are due, until interrupted. With `once`, run every job right away and return."""
+        try:
+            asyncio.get_event_loop().run_until_complete(self._run(once))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.connection.close()
+            self.cli.api.close()
+
+    async def _run(self, once):
+        if once:
+            for job in self.jobs:
+                await self._run_job(job)
+            return
+
+        now = time.time()
+        next_runs = dict((job.name, job.get_next_run(self.get_state(job)[0], now)) for job in self.jobs)
+        while True:
+            job = min(self.jobs, key=lambda job: next_runs[job.name])
+            delay = next_runs[job.name] - time.time()
+            if delay > 0:
+                self.cli.console.print('[italic]Next job: ' + job.name + ' at ' +
+                                       datetime.datetime.fromtimestamp(next_runs[job.name]).strftime('%Y-%m-%d %H:%M')
+                                       + '[/italic]')
+                await asyncio.sleep(delay)
+            await self._run_job(job)
+            next_runs[job.name] = job.get_next_run(self.get_state(job)[0], time.time())
+
+    async def _run_job(self, job):
+        start = time.time()
+        last_run, previous_inputs = self.get_state(job)
+        self.cli.console.rule(job.name + ' (' + datetime.datetime.fromtimestamp(start).strftime('%H:%M') + ')')
+        # The session might have expired since the last job, it's checked again (cheap probe, no sign in if valid)
+        self.cli.api.invalidate_session()
+        status = 'failed'
+        inputs = previous_inputs
+        try:
+            with tracing.span('job', job=job.name):
+                inputs, status = await asyncio.wait_for(self._run_command(job, previous_inputs), job.timeout)
+        except asyncio.TimeoutError:
+            status = 'timed out'
+        except Exception as e:
+            status = 'failed (' + (str(e) or e.__class__.__name__) + ')'
+
+        if status in ('done', 'skipped'):
+            self.set_state(job, start, inputs)
+        else:
+            # Retried at the next occurrence, the inputs aren't recorded
+            self.set_state(job, start, previous_inputs)
+        self.cli.console.print(f'[bold]{job.name}: {status} ({time.time() - start:.1f}s)[/bold]')
+
+    async def _run_command(self, job, previous_inputs):
+        inputs = None
+        if job.get_inputs is not None:
+            inputs = await job.get_inputs(self.cli.api)
+            if inputs is not None and inputs == previous_inputs:
+                return inputs, 'skipped'
+
+        result = await self.cli.api.execute(job.command)
+        if result is None or result is False or (isinstance(result, dict) and result.get('failed')):
+            return inputs, 'failed'
+        if job.command == 'get_points_balance':
+            self.cli._print_points_balance(result)
+        return inputs, 'done'
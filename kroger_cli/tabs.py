@@ -0,0 +1,116 @@
+import asyncio
+import contextlib
+
+
+class TabPool:
+    """Tabs of the signed-in browser kept open on the configured domain, checked out by the operations that need a
+    page of their own (instead of opening, and cold-loading, a new tab every time).
+
+    At most `size` tabs are checked out at once, the others wait for one to be returned. A tab is health-checked when
+    checked out (brought back to the domain if an operation left it elsewhere, replaced if it doesn't answer), and
+    closed after `max_uses` checkouts to bound the renderer's memory. The `extensions` (request blocker, popup
+    dismisser..) are attached to every tab it opens, and detached right before it's closed.
+    """
+
+    def __init__(self, browser, url, size=3, max_uses=20, extensions=(), timeout=5):
+        self.browser = browser
+        # Small page on the domain the idle tabs are parked on (origin, cookies and connections stay warm)
+        self.url = url
+        self.origin = '/'.join(url.split('/')[:3])
+        self.size = size
+        self.max_uses = max_uses
+        self.extensions = list(extensions)
+        self.timeout = timeout
+        self.idle = []
+        self.uses = {}
+        self.semaphore = asyncio.Semaphore(size)
+        self.checkouts = 0
+        self.reused = 0
+
+    async def fill(self, count=None):
+        """Pre-open tabs (up to the pool size) so the next checkouts don't wait for a new tab."""
+        count = self.size - len(self.uses) if count is None else min(count, self.size - len(self.uses))
+        tabs = await asyncio.gather(*[self._open() for _ in range(max(count, 0))], return_exceptions=True)
+        self.idle += [tab for tab in tabs if not isinstance(tab, BaseException)]
+
+    async def acquire(self):
+        await self.semaphore.acquire()
+        try:
+            self.checkouts += 1
+            while self.idle:
+                tab = self.idle.pop()
+                if await self._check(tab):
+                    self.reused += 1
+                    return tab
+                await self._close(tab)
+            return await self._open()
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    async def release(self, tab, discard=False):
+        """Return a checked out tab, it's closed when `discard` is set (e.g. left in an unknown state) or worn out."""
+        try:
+            if tab not in self.uses:
+                return
+            self.uses[tab] += 1
+            if discard or self.uses[tab] >= self.max_uses:
+                await self._close(tab)
+            else:
+                self.idle.append(tab)
+        finally:
+            self.semaphore.release()
+
+    @contextlib.asynccontextmanager
+    async def checkout(self):
+        tab = await self.acquire()
+        discard = True
+        try:
+            yield tab
+            discard = False
+        finally:
+            await self.release(tab, discard)
+
+    async def close(self):
+        for tab in list(self.uses):
+            await self._close(tab)
+        self.idle = []
+
+    def get_stats(self):
+        """Open and idle tabs, and the checkouts (and how many of them got an already open tab) since the last reset."""
+        return {'open': len(self.uses), 'idle': len(self.idle), 'checkouts': self.checkouts, 'reused': self.reused}
+
+    def reset_stats(self):
+        self.checkouts = 0
+        self.reused = 0
+
+    async def _open(self):
+        tab = await self.browser.get('about:blank', new_tab=True)
+        self.uses[tab] = 0
+        try:
+            for extension in self.extensions:
+                await extension.attach(tab)
+            await tab.get(self.url)
+        except BaseException:
+            await self._close(tab)
+            raise
+        return tab
+
+    async def _check(self, tab):
+        """The tab answers, and is on the domain (navigated back to it otherwise)."""
+        try:
+            origin = await asyncio.wait_for(tab.evaluate('location.origin'), self.timeout)
+            if origin != self.origin:
+                await asyncio.wait_for(tab.get(self.url), self.timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _close(self, tab):
+        self.uses.pop(tab, None)
+        for extension in self.extensions:
+            extension.detach(tab)
+        try:
+            await tab.close()
+        except Exception:
+            pass
@@ -0,0 +1,132 @@
+import contextlib
+import functools
+import json
+import os
+import time
+
+# Recorded spans, None while tracing is disabled (the default)
+_events = None
+_start = 0
+_task_ids = {}
+_null_span = contextlib.nullcontext()
+
+
+def enable():
+    global _events, _start
+    _events = []
+    _start = time.perf_counter_ns()
+    _task_ids.clear()
+
+
+def is_enabled():
+    return _events is not None
+
+
+def span(name, **args):
+    """Context manager timing the enclosed block. Costs a global lookup when tracing is disabled."""
+    if _events is None:
+        return _null_span
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator: record every call of the coroutine function as a span (named after the function by default)."""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _events is None:
+                return await func(*args, **kwargs)
+            with _Span(label, {}):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument(cls, methods):
+    """Wrap the given coroutine methods of a class (e.g. the browser tab's `find`, `select`, `evaluate`) in spans.
+    Meant to be called once tracing is enabled, so the methods aren't wrapped otherwise.
+    """
+    for method in methods:
+        original = getattr(cls, method)
+        if getattr(original, '__traced__', False):
+            continue
+
+        def wrap(original, method):
+            @functools.wraps(original)
+            async def wrapper(self, *args, **kwargs):
+                with span(method, arg=_describe(args[0]) if args else ''):
+                    return await original(self, *args, **kwargs)
+
+            wrapper.__traced__ = True
+            return wrapper
+
+        setattr(cls, method, wrap(original, method))
+
+
+def get_events():
+    return list(_events or [])
+
+
+def write(path):
+    """Write the spans in the Chrome trace event format (load it in chrome://tracing or https://ui.perfetto.dev)."""
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': get_events(), 'displayTimeUnit': 'ms'}, f)
+
+
+def get_summary(limit=15):
+    """Aggregate the spans by name: number of calls, total and slowest duration (seconds), slowest first."""
+    phases = {}
+    for event in _events or []:
+        phase = phases.setdefault(event['name'], {'name': event['name'], 'calls': 0, 'total': 0.0, 'max': 0.0})
+        duration = event['dur'] / 1e6
+        phase['calls'] += 1
+        phase['total'] += duration
+        phase['max'] = max(phase['max'], duration)
+
+    return sorted(phases.values(), key=lambda phase: phase['total'], reverse=True)[:limit]
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        _events.append({
+            'name': self.name,
+            'ph': 'X',
+            'ts': (self.start - _start) / 1000,
+            'dur': (end - self.start) / 1000,
+            'pid': os.getpid(),
+            'tid': _get_task_id(),
+            'args': self.args,
+        })
+        return False
+
+
+def _get_task_id():
+    """Concurrent asyncio tasks get their own row in the trace viewer."""
+    import asyncio
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return _task_ids.setdefault(id(task), len(_task_ids))
+
+
+def _describe(value):
+    text = str(value)
+    return text if len(text) <= 80 else text[:77] + '...'
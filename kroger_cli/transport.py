@@ -0,0 +1,147 @@
+import json
+import uuid
+from kroger_cli.jsonstream import JSONItemStream
+
+
+class FetchError(Exception):
+    def __init__(self, status, url):
+        super().__init__('Request to ' + url + ' failed with HTTP status ' + str(status))
+        self.status = status
+        self.url = url
+
+
+def get_fetch_js(url, method='GET', headers=None, body=None):
+    return f"""
+        (async () => {{
+            const response = await fetch({json.dumps(url)}, {{
+                method: {json.dumps(method)},
+                headers: {json.dumps(headers or {})},
+                body: {json.dumps(body)},
+                credentials: 'include'
+            }});
+            return {{
+                status: response.status,
+                url: response.url,
+                redirected: response.redirected,
+                body: await response.text()
+            }};
+        }})()
+    """
+
+
+async def fetch(page, url, method='GET', headers=None, body=None):
+    """Run `fetch()` inside the page, so the request carries the session's cookies.
+    Returns a dict with `status`, `url`, `redirected` and the raw `body`.
+    """
+    headers = dict(headers or {})
+    if body is not None and not isinstance(body, str):
+        body = json.dumps(body)
+        headers.setdefault('Content-Type', 'application/json')
+
+    return await page.evaluate(get_fetch_js(url, method, headers, body), await_promise=True)
+
+
+async def fetch_json(page, url, method='GET', headers=None, body=None):
+    """Same as `fetch`, but returns the decoded JSON body. Raises FetchError on HTTP errors."""
+    headers = dict(headers or {})
+    headers.setdefault('Accept', 'application/json')
+
+    response = await fetch(page, url, method, headers, body)
+    if response['status'] >= 400:
+        raise FetchError(response['status'], url)
+
+    return json.loads(response['body'])
+
+
+def get_stream_start_js(stream_id, url, method='GET', headers=None, body=None):
+    return f"""
+        (async () => {{
+            const response = await fetch({json.dumps(url)}, {{
+                method: {json.dumps(method)},
+                headers: {json.dumps(headers or {})},
+                body: {json.dumps(body)},
+                credentials: 'include'
+            }});
+            window.__krogerStreams = window.__krogerStreams || {{}};
+            window.__krogerStreams[{json.dumps(stream_id)}] = {{
+                reader: response.body.getReader(),
+                decoder: new TextDecoder()
+            }};
+            return {{status: response.status, url: response.url, redirected: response.redirected}};
+        }})()
+    """
+
+
+def get_stream_read_js(stream_id, chunk_size):
+    return f"""
+        (async () => {{
+            const stream = window.__krogerStreams[{json.dumps(stream_id)}];
+            let text = '';
+            while (text.length < {chunk_size}) {{
+                const {{done, value}} = await stream.reader.read();
+                if (done) {{
+                    delete window.__krogerStreams[{json.dumps(stream_id)}];
+                    return {{done: true, text: text + stream.decoder.decode()}};
+                }}
+                text += stream.decoder.decode(value, {{stream: true}});
+            }}
+            return {{done: false, text: text}};
+        }})()
+    """
+
+
+def get_stream_cancel_js(stream_id):
+    return f"""
+        (() => {{
+            const stream = (window.__krogerStreams || {{}})[{json.dumps(stream_id)}];
+            if (stream) {{
+                stream.reader.cancel();
+                delete window.__krogerStreams[{json.dumps(stream_id)}];
+            }}
+        }})()
+    """
+
+
+async def fetch_stream(page, url, method='GET', headers=None, body=None, chunk_size=64 * 1024):
+    """Same as `fetch`, but yields the response body as text chunks while it is being received."""
+    headers = dict(headers or {})
+    if body is not None and not isinstance(body, str):
+        body = json.dumps(body)
+        headers.setdefault('Content-Type', 'application/json')
+
+    stream_id = uuid.uuid4().hex
+    response = await page.evaluate(get_stream_start_js(stream_id, url, method, headers, body), await_promise=True)
+    done = False
+    try:
+        if response['status'] >= 400:
+            raise FetchError(response['status'], url)
+
+        while not done:
+            chunk = await page.evaluate(get_stream_read_js(stream_id, chunk_size), await_promise=True)
+            done = chunk['done']
+            if chunk['text']:
+                yield chunk['text']
+    finally:
+        if not done:
+            try:
+                await page.evaluate(get_stream_cancel_js(stream_id))
+            except Exception:
+                pass
+
+
+async def fetch_json_items(page, url, path=(), method='GET', headers=None, body=None):
+    """Decode the JSON response incrementally (see `JSONItemStream`), yields lists of items as the chunks arrive.
+    Peak memory is bounded by the chunk size, not by the size of the response.
+    """
+    headers = dict(headers or {})
+    headers.setdefault('Accept', 'application/json')
+
+    stream = JSONItemStream(path)
+    async for text in fetch_stream(page, url, method, headers, body):
+        items = stream.feed(text)
+        if items:
+            yield items
+
+    items = stream.close()
+    if items:
+        yield items
@@ -0,0 +1,153 @@
+import json
+import re
+import time
+from kroger_cli import database
+from kroger_cli.catalog import fields, get_content_hash, get_unique
+
+_word = re.compile(r'\w+')
+
+
+def get_words(text):
+    return _word.findall((text or '').lower())
+
+
+class Watchlist:
+    """Watched products/brands of an account, and the snapshots of the offers seen by the previous runs.
+
+    Every run stores a snapshot of the offers (ID and content hash) and diffs it against the previous one with a
+    join on the primary key, only the new or changed offers are then matched against the watch terms.
+    """
+
+    def __init__(self, namespace, path=None):
+        self.namespace = namespace
+        self.connection = database.connect(path)
+        with self.connection:
+            # `checked` is cleared for new terms: their first run matches them against all the offers
+            self.connection.execute('CREATE TABLE IF NOT EXISTS watch_terms (namespace TEXT NOT NULL, '
+                                    'term TEXT NOT NULL, checked INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, '
+                                    'PRIMARY KEY (namespace, term))')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS watch_snapshots (namespace TEXT NOT NULL, '
+                                    'snapshot INTEGER NOT NULL, created REAL NOT NULL, offers INTEGER NOT NULL, '
+                                    'PRIMARY KEY (namespace, snapshot))')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS watch_offers (namespace TEXT NOT NULL, '
+                                    'snapshot INTEGER NOT NULL, id TEXT NOT NULL, hash TEXT NOT NULL, '
+                                    'PRIMARY KEY (namespace, snapshot, id))')
+
+    def add_terms(self, terms):
+        now = time.time()
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO watch_terms (namespace, term, created) VALUES (?, ?, ?)',
+                                        [(self.namespace, ' '.join(get_words(term)), now) for term in terms
+                                         if get_words(term)])
+
+    def remove_terms(self, terms):
+        with self.connection:
+            cursor = self.connection.executemany('DELETE FROM watch_terms WHERE namespace = ? AND term = ?',
+                                                 [(self.namespace, ' '.join(get_words(term))) for term in terms])
+        return cursor.rowcount
+
+    def get_terms(self):
+        return [row[0] for row in self.connection.execute('SELECT term FROM watch_terms WHERE namespace = ? '
+                                                          'ORDER BY term', (self.namespace,))]
+
+    def get_last_snapshot(self):
+        row = self.connection.execute('SELECT MAX(snapshot) FROM watch_snapshots WHERE namespace = ?',
+                                      (self.namespace,)).fetchone()
+        return row[0] if row is not None else None
+
+    def snapshot(self, offers):
+        """Store a snapshot of the offers, returns the IDs of the offers that are new or changed since the previous
+        snapshot (all of them on the first run). Offers are compared by their content hash, so clipping an offer
+        doesn't make it a changed one. Only the previous snapshot is kept.
+        """
+        previous = self.get_last_snapshot()
+        current = (previous or 0) + 1
+        with self.connection:
+            self.connection.execute('INSERT INTO watch_snapshots (namespace, snapshot, created, offers) '
+                                    'VALUES (?, ?, ?, ?)', (self.namespace, current, time.time(), len(offers)))
+            self.connection.executemany('INSERT OR REPLACE INTO watch_offers (namespace, snapshot, id, hash) '
+                                        'VALUES (?, ?, ?, ?)',
+                                        [(self.namespace, current, offer['id'], get_content_hash(offer))
+                                         for offer in offers])
+            changed = set(row[0] for row in self.connection.execute(
+                'SELECT n.id FROM watch_offers n LEFT JOIN watch_offers o ON o.namespace = n.namespace '
+                'AND o.snapshot = ? AND o.id = n.id WHERE n.namespace = ? AND n.snapshot = ? '
+                'AND (o.id IS NULL OR o.hash != n.hash)', (previous or 0, self.namespace, current)))
+            self.connection.execute('DELETE FROM watch_offers WHERE namespace = ? AND snapshot < ?',
+                                    (self.namespace, current))
+            self.connection.execute('DELETE FROM watch_snapshots WHERE namespace = ? AND snapshot < ?',
+                                    (self.namespace, current))
+
+        return changed
+
+    def check(self, offers):
+        """Snapshot the offers and return the alerts: the new or changed offers matching a watch term, plus all the
+        offers matching the terms added since the last run.
+        """
+        offers = get_unique(offers)
+        changed = self.snapshot(offers)
+        terms = self.connection.execute('SELECT term, checked FROM watch_terms WHERE namespace = ?',
+                                        (self.namespace,)).fetchall()
+        new_terms = [term for term, checked in terms if not checked]
+        alerts = match_offers([offer for offer in offers if offer['id'] in changed],
+                              [term for term, checked in terms if checked])
+        # Terms that never ran are matched against the whole listing, an offer already reported isn't repeated
+        reported = set((alert['term'], alert['id']) for alert in alerts)
+        alerts += [alert for alert in match_offers(offers, new_terms) if (alert['term'], alert['id']) not in reported]
+
+        with self.connection:
+            self.connection.executemany('UPDATE watch_terms SET checked = 1 WHERE namespace = ? AND term = ?',
+                                        [(self.namespace, term) for term in new_terms])
+        return alerts
+
+    def close(self):
+        self.connection.close()
+
+
+def match_offers(offers, terms):
+    """Return an alert for every (term, offer) pair where each word of the term starts a word of the offer's brand,
+    description or category. Uses an inverted index of the word prefixes, so the cost doesn't grow with
+    offers x terms.
+    """
+    if not offers or not terms:
+        return []
+
+    index = {}
+    for position, offer in enumerate(offers):
+        words = get_words(' '.join(str(offer.get(field) or '') for field in ('brand', 'description', 'category')))
+        for word in set(words):
+            for length in range(1, len(word) + 1):
+                index.setdefault(word[:length], set()).add(position)
+
+    alerts = []
+    for term in terms:
+        positions = None
+        for word in term.split():
+            matches = index.get(word)
+            if not matches:
+                positions = None
+                break
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                break
+        for position in sorted(positions or ()):
+            alert = dict((field, offers[position].get(field)) for field in ['id'] + fields)
+            alert['term'] = term
+            alerts.append(alert)
+
+    return alerts
+
+
+def send_alerts(alerts, output=None, webhook=None):
+    """Append the alerts to a JSON Lines file and/or POST them (as a JSON list) to a webhook."""
+    if output:
+        with open(output, 'a', encoding='utf-8') as file:
+            for alert in alerts:
+                file.write(json.dumps(alert) + '\n')
+
+    if webhook:
+        import urllib.request
+        request = urllib.request.Request(webhook, data=json.dumps(alerts).encode(), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()